@@ -0,0 +1,233 @@
+import hashlib
+import io
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import timed
+
+# ---------- Chat Attachments ----------
+# Uploads run on a worker pool so Send returns immediately. Each file is
+# streamed to storage in fixed-size chunks (progress is the bytes read so
+# far) and images get a small PNG thumbnail uploaded next to them under
+# thumbs/. An on_done callback runs on the worker once the file is stored
+# (the chat inserts its message there), so it completes even if the
+# session that started it has gone away. The chat shows thumbnails from a size-bounded local disk cache
+# and loads the full-size original only when asked to.
+
+CHAT_BUCKET = "chat_files"
+UPLOAD_WORKERS = 2
+UPLOAD_CHUNK_SIZE = 256 * 1024
+THUMBNAIL_SIZE = (200, 200)
+THUMBNAIL_DIR = ".thumbnail_cache"
+THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024
+THUMBNAIL_MISSING_MAX = 4096   # urls remembered as having no thumbnail
+
+
+def thumbnail_path(filename):
+    return f"thumbs/{filename}.png"
+
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE):
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail(size)
+        out = io.BytesIO()
+        image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+class _ProgressReader(io.RawIOBase):
+    """Raw stream over bytes that reports how much has been read."""
+
+    def __init__(self, data, on_read):
+        self._data = memoryview(data)
+        self._pos = 0
+        self._on_read = on_read
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self._data) - self._pos)
+        buffer[:n] = self._data[self._pos:self._pos + n]
+        self._pos += n
+        self._on_read(n)
+        return n
+
+
+class UploadJob:
+    def __init__(self, name, content_type, size, meta):
+        self.name = name
+        self.content_type = content_type
+        self.size = size
+        self.meta = meta            # caller data carried through (e.g. the message to insert)
+        # The name comes from the client: only its last path part goes into the storage key.
+        self.filename = f"{uuid.uuid4()}_{os.path.basename(name)}"
+        self.sent = 0
+        self.status = "queued"      # queued -> uploading -> done | failed
+        self.error = None
+        self.media_url = None
+        self.result = None          # what on_done returned
+
+    @property
+    def progress(self):
+        return 1.0 if self.status == "done" else (self.sent / self.size if self.size else 0.0)
+
+
+class AttachmentPipeline:
+    def __init__(self, storage, public_url_base, bucket=CHAT_BUCKET, workers=UPLOAD_WORKERS, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.storage = storage
+        self.public_url_base = public_url_base.rstrip("/")
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-upload")
+
+    def submit(self, name, data, content_type, meta=None, on_done=None):
+        """Queue an upload; on_done(job) is called on the worker after the file is stored."""
+        job = UploadJob(name, content_type, len(data), meta)
+        self._executor.submit(self._run, job, data, on_done)
+        return job
+
+    def _upload_thumbnail(self, bucket, job, data):
+        try:
+            bucket.upload(thumbnail_path(job.filename), make_thumbnail(data), {"content-type": "image/png"})
+        except Exception:
+            # Unreadable image, decompression-bomb guard, ...: the chat shows the original instead.
+            pass
+
+    def _run(self, job, data, on_done=None):
+        job.status = "uploading"
+        try:
+            bucket = self.storage.from_(self.bucket)
+            if content_type_is_image(job.content_type):
+                self._upload_thumbnail(bucket, job, data)
+
+            def on_read(n):
+                job.sent += n
+
+            stream = io.BufferedReader(_ProgressReader(data, on_read), buffer_size=self.chunk_size)
+            res = bucket.upload(job.filename, stream, {"content-type": job.content_type})
+            if getattr(res, "status_code", 200) >= 400:
+                raise RuntimeError(f"upload failed with status {res.status_code}")
+            job.media_url = f"{self.public_url_base}/{job.filename}"
+            if on_done is not None:
+                job.result = on_done(job)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+
+
+def content_type_is_image(content_type):
+    return bool(content_type) and content_type.startswith("image/")
+
+
+def is_not_found(error):
+    """True if a storage download failed because the object does not exist."""
+    if isinstance(error, FileNotFoundError):
+        return True
+    # storage3's StorageApiError carries the API's statusCode as status.
+    return str(getattr(error, "status", "")) == "404" or "not found" in str(getattr(error, "message", "")).lower()
+
+
+class ThumbnailCache:
+    """LRU cache of thumbnail bytes on local disk, bounded by total size."""
+
+    def __init__(self, storage, public_url_base, directory=THUMBNAIL_DIR, max_bytes=THUMBNAIL_CACHE_BYTES, bucket=CHAT_BUCKET):
+        self.storage = storage
+        self.public_url_base = public_url_base.rstrip("/")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bucket = bucket
+        self._lock = threading.Lock()
+        self._missing = OrderedDict()  # media urls with no thumbnail in storage, least recently added first
+        self._sizes = OrderedDict()    # cache file name -> size, least recently used first
+        os.makedirs(directory, exist_ok=True)
+        files = [(entry.stat().st_atime, entry.name, entry.stat().st_size) for entry in os.scandir(directory) if entry.is_file()]
+        for _, name, size in sorted(files):
+            self._sizes[name] = size
+        self._total = sum(self._sizes.values())
+
+    @timed("io", "thumbnail")
+    def get(self, media_url):
+        """Thumbnail bytes for a chat attachment, or None when it has none (e.g. older messages)."""
+        prefix = self.public_url_base + "/"
+        if not media_url.startswith(prefix) or media_url in self._missing:
+            return None
+        key = hashlib.sha256(media_url.encode("utf-8")).hexdigest()
+        path = os.path.join(self.directory, key)
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+                try:
+                    with open(path, "rb") as f:
+                        return f.read()
+                except FileNotFoundError:
+                    self._total -= self._sizes.pop(key)
+        try:
+            data = self.storage.from_(self.bucket).download(thumbnail_path(media_url[len(prefix):]))
+        except Exception as e:
+            # Only a real "not found" is remembered; other failures are retried on the next rerun.
+            if is_not_found(e):
+                with self._lock:
+                    self._missing[media_url] = None
+                    while len(self._missing) > THUMBNAIL_MISSING_MAX:
+                        self._missing.popitem(last=False)
+            return None
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                old_key, old_size = self._sizes.popitem(last=False)
+                self._total -= old_size
+                try:
+                    os.remove(os.path.join(self.directory, old_key))
+                except FileNotFoundError:
+                    pass
+        return data
+
+
+class LocalStorage:
+    """Directory-backed stand-in for supabase.storage (from_/upload/download)."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def from_(self, bucket):
+        return _LocalBucket(os.path.join(self.root, bucket))
+
+
+class _LocalBucket:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def upload(self, path, file, file_options=None):
+        target = os.path.join(self.directory, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write aside and rename, so other processes never read a partial file.
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                if isinstance(file, bytes):
+                    f.write(file)
+                else:
+                    for chunk in iter(lambda: file.read(UPLOAD_CHUNK_SIZE), b""):
+                        f.write(chunk)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {"Key": path}
+
+    def download(self, path):
+        with open(os.path.join(self.directory, path), "rb") as f:
+            return f.read()
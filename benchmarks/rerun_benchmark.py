@@ -0,0 +1,218 @@
+"""Headless rerun benchmark for streamlit_app.py.
+
+Runs the app through Streamlit's AppTest against the in-memory backend
+(SUPABASE_URL = "memory://...") and a throwaway SQLite database, seeded
+with N contacts, M messages, H history entries and L life-roadmap events.
+For every section it records the first-visit and warm rerun latency, the
+number of backend queries per rerun and the memory allocated, and prints
+one JSON object per (workload, section) line. In History every entry on
+the first page is opened, so diagram and roadmap rendering are measured.
+
+    python benchmarks/rerun_benchmark.py
+    python benchmarks/rerun_benchmark.py --workload 100,2000,50,200 --reruns 10 --output bench.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from attachments import LocalStorage  # noqa: E402
+from data_access import memory_repository  # noqa: E402
+from storage import ConnectionPool, UserDataStore, UserStore, init_schema, init_user_data_schema  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, "streamlit_app.py")
+USER_EMAIL = "bench@example.com"
+USER_PASSWORD = "bench"
+SECTIONS = ["🏠 Home", "💬 Messaging", "📚 History", "👤 Biodata", "🧰 Tools"]
+# (contacts, messages, history entries, lifemap events)
+DEFAULT_WORKLOADS = [(10, 100, 10, 20), (100, 2000, 100, 200), (500, 20000, 500, 1000)]
+
+
+def seed_backend(repo, contacts, messages, rng):
+    contact_ids = [f"contact{i}@example.com" for i in range(contacts)]
+    repo.tables["users"] = [{"id": uid, "email": uid} for uid in [USER_EMAIL] + contact_ids]
+    repo.tables["contacts"] = [
+        {"requester_id": USER_EMAIL if i % 2 else uid, "requestee_id": uid if i % 2 else USER_EMAIL, "status": "accepted"}
+        for i, uid in enumerate(contact_ids)
+    ]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(messages if contact_ids else 0):
+        other = rng.choice(contact_ids)
+        incoming = rng.random() < 0.5
+        rows.append({
+            "id": f"seed-{i}",  # never collides with the integer ids of messages sent during the run
+            "sender_id": other if incoming else USER_EMAIL,
+            "receiver_id": USER_EMAIL if incoming else other,
+            "text": f"message {i}",
+            "media_url": None,
+            "media_type": None,
+            "created_at": (start + timedelta(seconds=i)).isoformat(),
+        })
+    repo.tables["messages"] = rows
+
+
+def seed_local(workdir, history, lifemap, rng):
+    pool = ConnectionPool(os.path.join(workdir, "user_data.db"))
+    init_schema(pool)
+    init_user_data_schema(pool)
+    UserStore(pool).create(USER_EMAIL, hashlib.sha256(USER_PASSWORD.encode()).hexdigest())
+    store = UserDataStore(pool)
+    store.set_bio_fields(USER_EMAIL, {"name": "Bench User", "dob": "1990-01-01"})
+    names = [f"Person {i}" for i in range(12)]
+    entries = []
+    for i in range(history):
+        kind = ("Ecomap", "Social Network", "Life Roadmap")[i % 3]
+        entry = {"type": kind, "title": f"{kind} {i}", "timestamp": str(datetime(2024, 1, 1) + timedelta(minutes=i))}
+        if kind == "Life Roadmap":
+            years = sorted(rng.randint(1990, 2024) for _ in range(20))
+            entry["columns"] = {"Time": [str(year) for year in years], "Key": [float(year) for year in years],
+                                "Event": [f"Event {j}" for j in range(20)], "Impact": [rng.randint(-10, 10) for _ in years]}
+        else:
+            nodes = {"You": {"shape": "circle", "color": "blue"}}
+            edges = []
+            for name in rng.sample(names, 6):
+                nodes[name] = {"shape": "circle", "color": "green"}
+                edges.append(["You", name, {"color": "green", "label": "─────", "style": "solid"}])
+            entry["graph"] = {"nodes": nodes, "edges": edges}
+        entries.append(entry)
+    if entries:
+        store.add_history_batch(USER_EMAIL, entries)
+    for i in range(lifemap):
+        year = 1990 + i * 35 // max(lifemap, 1)
+        store.add_lifemap_event(USER_EMAIL, str(year), f"Event {i}", rng.randint(-10, 10), float(year))
+
+
+def timed_run(at, repo):
+    queries = repo.query_count
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"app raised: {[e.value for e in at.exception]}")
+    return elapsed * 1000, repo.query_count - queries
+
+
+def open_history_entries(at):
+    """Switch on the Show toggle of every entry on the current History page."""
+    toggles = [toggle for toggle in at.toggle if (toggle.key or "").startswith("show_")]
+    for toggle in toggles:
+        toggle.set_value(True)
+    return len(toggles)
+
+
+def measure_memory(at):
+    tracemalloc.start()
+    at.run()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current // 1024, peak // 1024
+
+
+def run_workload(workload, reruns, seed, timeout):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    contacts, messages, history, lifemap = workload
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix="jalinan-bench-") as workdir:
+        url = f"memory://bench-{contacts}-{messages}-{history}-{lifemap}-{seed}"
+        repo = memory_repository(url, storage=LocalStorage(os.path.join(workdir, "local_storage")))
+        seed_backend(repo, contacts, messages, rng)
+        seed_local(workdir, history, lifemap, rng)
+
+        cwd = os.getcwd()
+        os.chdir(workdir)  # the app keeps its SQLite database and caches in the working directory
+        try:
+            # Process-wide resources (connection pool, caches) must not leak between workloads.
+            st.cache_resource.clear()
+            at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+            at.secrets["SUPABASE_URL"] = url
+            at.secrets["SUPABASE_KEY"] = "bench"
+            login_ms, login_queries = timed_run(at, repo)
+            at.sidebar.text_input(key="login_email").input(USER_EMAIL)
+            at.sidebar.text_input(key="login_password").input(USER_PASSWORD)
+            at.sidebar.button[0].click()
+            timed_run(at, repo)
+            at.session_state["selected_tool"] = "Life"
+
+            results = [{"section": "login", "first_ms": round(login_ms, 2), "first_queries": login_queries}]
+            for section in SECTIONS:
+                at.radio(key="active_section").set_value(section)
+                first_ms, first_queries = timed_run(at, repo)
+                opened = open_history_entries(at) if section == "📚 History" else 0
+                # Opening entries lays out their diagrams and builds roadmap frames for the first time.
+                open_ms = round(timed_run(at, repo)[0], 2) if opened else None
+                warm = [timed_run(at, repo) for _ in range(reruns)]
+                retained_kb, peak_kb = measure_memory(at)
+                warm_ms = sorted(ms for ms, _ in warm)
+                results.append({
+                    "section": section.split(" ", 1)[1],
+                    "first_ms": round(first_ms, 2),
+                    "first_queries": first_queries,
+                    "opened_entries": opened,
+                    "open_ms": open_ms,
+                    "warm_median_ms": round(statistics.median(warm_ms), 2) if warm_ms else None,
+                    "warm_p95_ms": round(warm_ms[min(len(warm_ms) - 1, int(len(warm_ms) * 0.95))], 2) if warm_ms else None,
+                    "warm_queries": round(statistics.mean(q for _, q in warm), 2) if warm else None,
+                    "retained_kb": retained_kb,
+                    "peak_kb": peak_kb,
+                })
+        finally:
+            os.chdir(cwd)
+            # Release the connection pool and caches that point into the directory being removed.
+            st.cache_resource.clear()
+    workload_info = {"contacts": contacts, "messages": messages, "history": history, "lifemap": lifemap}
+    return [{"workload": workload_info, **result} for result in results]
+
+
+def parse_workload(text):
+    values = [int(v) for v in text.split(",")]
+    if len(values) != 4:
+        raise argparse.ArgumentTypeError("expected contacts,messages,history,lifemap")
+    return tuple(values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workload", type=parse_workload, action="append",
+                        help="contacts,messages,history,lifemap (repeatable; default: small, medium and large)")
+    parser.add_argument("--reruns", type=int, default=5, help="warm reruns per section")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per rerun")
+    parser.add_argument("--output", help="append JSON lines to this file as well as stdout")
+    args = parser.parse_args(argv)
+
+    run = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "streamlit": __import__("streamlit").__version__,
+        "reruns": args.reruns,
+        "seed": args.seed,
+    }
+    out = open(args.output, "a", encoding="utf-8") if args.output else None
+    try:
+        for workload in args.workload or DEFAULT_WORKLOADS:
+            for record in run_workload(workload, args.reruns, args.seed, args.timeout):
+                line = json.dumps({**run, **record}, ensure_ascii=False)
+                print(line, flush=True)
+                if out:
+                    out.write(line + "\n")
+    finally:
+        if out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
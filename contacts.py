@@ -0,0 +1,277 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+# ---------- Contact Directory ----------
+# Resolves contact ids to display labels. Misses are fetched from the
+# "users" table in bulk and kept in a per-process TTL cache, so a
+# rerun with hundreds of contacts costs a dict lookup instead of one HTTP
+# round trip per contact.
+
+DIRECTORY_TTL = 300          # seconds before a cached label is refetched
+DIRECTORY_MAX_ENTRIES = 50000
+
+
+class ContactDirectory:
+    def __init__(self, repo, ttl=DIRECTORY_TTL, max_entries=DIRECTORY_MAX_ENTRIES):
+        self.repo = repo
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # id -> (label, expires_at)
+        self._lock = threading.Lock()
+
+    def labels(self, ids):
+        """Return {id: label} for every id, falling back to str(id) for unknown users."""
+        now = time.monotonic()
+        result = {}
+        missing = []
+        with self._lock:
+            for uid in dict.fromkeys(ids):
+                entry = self._entries.get(uid)
+                if entry and entry[1] > now:
+                    result[uid] = entry[0]
+                else:
+                    missing.append(uid)
+        if missing:
+            fetched = self.repo.user_emails(missing)
+            expires_at = time.monotonic() + self.ttl
+            with self._lock:
+                for uid in missing:
+                    label = fetched.get(uid, str(uid))
+                    self._entries[uid] = (label, expires_at)
+                    result[uid] = label
+                self._evict(now)
+        return result
+
+    def label(self, uid):
+        return self.labels([uid])[uid]
+
+    def invalidate(self, ids=None):
+        """Drop the given ids from the cache, or everything when ids is None."""
+        with self._lock:
+            if ids is None:
+                self._entries.clear()
+            else:
+                for uid in ids:
+                    self._entries.pop(uid, None)
+
+    def _evict(self, now):
+        if len(self._entries) <= self.max_entries:
+            return
+        expired = [uid for uid, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for uid in expired:
+            del self._entries[uid]
+        # Still too large: drop the entries closest to expiry first.
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            for uid, _ in sorted(self._entries.items(), key=lambda kv: kv[1][1])[:overflow]:
+                del self._entries[uid]
+
+
+# ---------- Contact Search ----------
+# Prefix and fuzzy lookup over the whole user directory (id, email and the
+# biodata name), answered from memory. The directory is read once per
+# process in id-ordered pages and reloaded in the background every
+# SEARCH_RESYNC seconds; that reload is what brings in new users. Between
+# reloads the change feed's biodata name edits are applied at once. Its
+# "users" keys are local sign-up emails, so they only match directory rows
+# whose id is the email (the app's fallback when Supabase auth is not used);
+# sign-ups that never reach the Supabase users table are not indexed. Terms
+# are kept in a sorted list for prefix scans and in a bigram index for typos.
+
+SEARCH_MAX_USERS = 50000     # users beyond this are not indexed (about 1.5 KB each)
+SEARCH_RESYNC = 3600         # seconds between full directory reloads
+SEARCH_LIMIT = 10
+FUZZY_MIN_SCORE = 0.4        # Dice coefficient of padded bigrams
+FUZZY_CANDIDATES = 50        # terms scored per fuzzy query
+
+
+def _normalize(text):
+    return " ".join(str(text).casefold().split())
+
+
+def _bigrams(term):
+    padded = f" {term} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def _terms(uid, email, name):
+    terms = {_normalize(uid), _normalize(email), _normalize(email).split("@", 1)[0]}
+    if name:
+        name = _normalize(name)
+        terms.add(name)
+        terms.update(name.split())
+    terms.discard("")
+    return terms
+
+
+def _fuzzy_term(term):
+    # Typos are matched within single words (name parts, email user names) only.
+    return " " not in term and "@" not in term
+
+
+class ContactSearchIndex:
+    def __init__(self, repo, names, max_users=SEARCH_MAX_USERS, resync=SEARCH_RESYNC):
+        """names(emails) returns {email: biodata name}; emails=None means everyone."""
+        self.repo = repo
+        self.names = names
+        self.max_users = max_users
+        self.resync = resync
+        self._users = {}                 # id -> (email, name)
+        self._ids_by_email = {}
+        self._sorted = []                # distinct terms, sorted
+        self._owners = {}                # term -> {id}
+        self._postings = defaultdict(set)  # bigram -> {term}
+        self._pending_ids = set()
+        self._pending_names = set()
+        self._loaded_at = None
+        self._resyncing = False
+        self._journals = []              # per load in progress: changes applied while it reads
+        self._lock = threading.Lock()
+
+    # --- change feed handlers: record only, so polling never waits on the backend ---
+    def users_changed(self, ids):
+        with self._lock:
+            self._pending_ids.update(ids)
+
+    def names_changed(self, emails):
+        with self._lock:
+            self._pending_names.update(emails)
+
+    def load(self):
+        """Read the whole directory and replace the index."""
+        journal = []
+        with self._lock:
+            self._journals.append(journal)
+        try:
+            emails = {row["id"]: row.get("email") or str(row["id"]) for row in self.repo.directory_users(self.max_users)}
+            names = self.names(None)
+        except BaseException:
+            with self._lock:
+                self._journals.remove(journal)
+            raise
+        users = {uid: (email, names.get(email)) for uid, email in emails.items()}
+        owners, postings = {}, defaultdict(set)
+        for uid, record in users.items():
+            for term in _terms(uid, *record):
+                if term not in owners:
+                    owners[term] = set()
+                    if _fuzzy_term(term):
+                        for gram in _bigrams(term):
+                            postings[gram].add(term)
+                owners[term].add(uid)
+        with self._lock:
+            self._journals.remove(journal)
+            self._users = users
+            self._ids_by_email = {email: uid for uid, (email, _) in users.items()}
+            self._sorted, self._owners, self._postings = sorted(owners), owners, postings
+            self._loaded_at = time.monotonic()
+            # Changes applied while the directory was being read may be newer than the snapshot.
+            for change in journal:
+                self._put(*change)
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Up to `limit` users as {id, email, name}: prefix matches first, then close spellings."""
+        self._catch_up()
+        query = _normalize(query)
+        if not query:
+            return []
+        with self._lock:
+            found = self._prefix(query, limit)
+            if len(found) < limit and len(query) >= 3:
+                for uid in self._fuzzy(query):
+                    if uid not in found:
+                        found.append(uid)
+                        if len(found) == limit:
+                            break
+            return [{"id": uid, "email": self._users[uid][0], "name": self._users[uid][1]} for uid in found]
+
+    def __len__(self):
+        return len(self._users)
+
+    def _catch_up(self):
+        if self._loaded_at is None:
+            self.load()
+        with self._lock:
+            resync = time.monotonic() - self._loaded_at > self.resync and not self._resyncing
+            if resync:
+                self._resyncing = True
+        if resync:
+            threading.Thread(target=self._background_load, name="contact-search-resync", daemon=True).start()
+        with self._lock:
+            ids, self._pending_ids = self._pending_ids, set()
+            emails, self._pending_names = self._pending_names, set()
+        if ids:
+            found = self.repo.user_emails(ids)
+            names = self.names(list(found.values()))
+            with self._lock:
+                for uid, email in found.items():
+                    self._put(uid, email, names.get(email))
+        if emails:
+            names = self.names(emails)
+            with self._lock:
+                for email in emails:
+                    uid = self._ids_by_email.get(email)
+                    if uid is not None:
+                        self._put(uid, email, names.get(email))
+
+    def _background_load(self):
+        try:
+            self.load()
+        finally:
+            with self._lock:
+                self._resyncing = False
+
+    def _put(self, uid, email, name):
+        for journal in self._journals:
+            journal.append((uid, email, name))
+        old = self._users.get(uid)
+        if old == (email, name):
+            return
+        if old is None and len(self._users) >= self.max_users:
+            return
+        if old is not None:
+            self._ids_by_email.pop(old[0], None)
+            for term in _terms(uid, *old):
+                owners = self._owners[term]
+                owners.discard(uid)
+                if not owners:
+                    del self._owners[term]
+                    del self._sorted[bisect_left(self._sorted, term)]
+                    if _fuzzy_term(term):
+                        for gram in _bigrams(term):
+                            self._postings[gram].discard(term)
+        self._users[uid] = (email, name)
+        self._ids_by_email[email] = uid
+        for term in _terms(uid, email, name):
+            if term not in self._owners:
+                self._owners[term] = set()
+                insort(self._sorted, term)
+                if _fuzzy_term(term):
+                    for gram in _bigrams(term):
+                        self._postings[gram].add(term)
+            self._owners[term].add(uid)
+
+    def _prefix(self, query, limit):
+        found = {}
+        for term in self._sorted[bisect_left(self._sorted, query):]:
+            if not term.startswith(query):
+                break
+            for uid in sorted(self._owners[term]):
+                found.setdefault(uid)
+                if len(found) == limit:
+                    return list(found)
+        return list(found)
+
+    def _fuzzy(self, query):
+        grams = _bigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for term, count in shared.most_common(FUZZY_CANDIDATES):
+            score = 2 * count / (len(grams) + len(_bigrams(term)))
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((-score, term))
+        return [uid for _, term in sorted(scored) for uid in sorted(self._owners[term])]
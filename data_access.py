@@ -0,0 +1,307 @@
+import contextvars
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone
+
+from instrumentation import span
+
+# ---------- Data Access ----------
+# Every Supabase query the app makes goes through a Repository. One instance
+# (and so one HTTP client and connection pool) is shared by all sessions in
+# the process. Queries run on a worker pool with a bounded wait and retries
+# on transient network errors, so independent lookups can be issued
+# concurrently. InMemoryRepository implements the same queries over plain
+# lists for local runs, tests and benchmarks (SUPABASE_URL = "memory://...").
+
+DATA_TIMEOUT = 10            # seconds a caller waits for one query (including retries)
+DATA_RETRIES = 2             # extra attempts after a transient failure
+RETRY_BACKOFF = 0.2          # seconds before the first retry; doubles each attempt
+DATA_WORKERS = 8
+LOOKUP_BATCH_SIZE = 200      # keeps the PostgREST `in.(...)` filter URL short
+DIRECTORY_PAGE_SIZE = 1000   # users per page when reading the whole directory
+
+
+class DataAccessError(Exception):
+    """A query timed out or kept failing after its retries."""
+
+
+def _transient_errors():
+    errors = (ConnectionError, TimeoutError)
+    try:
+        import httpx
+    except ImportError:
+        return errors
+    return errors + (httpx.TransportError,)
+
+
+TRANSIENT_ERRORS = _transient_errors()
+# PostgREST / Postgres codes for an RPC whose function is not deployed.
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+
+def is_missing_function(error):
+    """True if error says the called database function does not exist (its migration is not applied)."""
+    return getattr(error, "code", None) in MISSING_FUNCTION_CODES
+
+
+def conversation_filter(user_id, contact_id):
+    return (
+        f"and(sender_id.eq.{user_id},receiver_id.eq.{contact_id}),"
+        f"and(sender_id.eq.{contact_id},receiver_id.eq.{user_id})"
+    )
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Repository:
+    """Timeouts, retries and concurrency around a backend's queries.
+
+    Subclasses implement the underscore methods; each runs on a pool thread.
+    Errors that are not transient (e.g. a missing table) are raised as is.
+    """
+
+    def __init__(self, timeout=DATA_TIMEOUT, retries=DATA_RETRIES, backoff=RETRY_BACKOFF, workers=DATA_WORKERS):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="data-access")
+
+    def submit(self, fn, *args):
+        """Run fn(*args) with retries on the pool; returns a Future."""
+        # The caller's context goes along, so the query lands in its rerun profile.
+        return self._executor.submit(contextvars.copy_context().run, self._with_retries, fn, args)
+
+    def gather(self, *calls):
+        """Run (fn, *args) calls concurrently; results in call order, all within one timeout."""
+        futures = [self.submit(fn, *args) for fn, *args in calls]
+        deadline = time.monotonic() + self.timeout
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=max(0, deadline - time.monotonic())))
+            except FutureTimeout:
+                for pending in futures:
+                    pending.cancel()
+                raise DataAccessError(f"query did not finish within {self.timeout}s") from None
+        return results
+
+    def call(self, fn, *args):
+        return self.gather((fn, *args))[0]
+
+    def _with_retries(self, fn, args):
+        for attempt in itertools.count():
+            try:
+                with span("query", fn.__name__.lstrip("_")):
+                    return fn(*args)
+            except TRANSIENT_ERRORS as e:
+                if attempt >= self.retries:
+                    raise DataAccessError(f"query failed after {attempt + 1} attempts: {e}") from e
+                time.sleep(self.backoff * 2 ** attempt)
+
+    # --- contacts ---
+    def accepted_contacts(self, user_id):
+        """Ids of the user's accepted contacts."""
+        return self.call(self._accepted_contacts, user_id)
+
+    def conversation_inbox(self, user_id):
+        """Rows of contact_id, last_text, last_media_type, last_sender_id, last_at, unread_count."""
+        return self.call(self._conversation_inbox, user_id)
+
+    # --- users ---
+    def user_emails(self, ids):
+        """{id: email} for the ids that exist, fetched in concurrent batches."""
+        ids = list(ids)
+        batches = [ids[start:start + LOOKUP_BATCH_SIZE] for start in range(0, len(ids), LOOKUP_BATCH_SIZE)]
+        found = {}
+        for rows in self.gather(*[(self._users, batch) for batch in batches]):
+            for row in rows:
+                found[row["id"]] = row.get("email") or str(row["id"])
+        return found
+
+    def directory_users(self, limit=None):
+        """id and email rows of every user (at most limit), read in id-ordered pages."""
+        rows, after = [], None
+        while limit is None or len(rows) < limit:
+            page = self.call(self._user_page, after, DIRECTORY_PAGE_SIZE)
+            rows.extend(page)
+            if len(page) < DIRECTORY_PAGE_SIZE:
+                break
+            after = page[-1]["id"]
+        return rows[:limit]
+
+    # --- messages ---
+    def conversation_messages(self, user_id, contact_id, since=None, until=None, newest_first=False, limit=None):
+        """Messages between two users, optionally bounded by created_at (inclusive)."""
+        return self.call(self._conversation_messages, user_id, contact_id, since, until, newest_first, limit)
+
+    def insert_message(self, row):
+        """Insert a message; returns the stored rows (with id and created_at)."""
+        return self.call(self._insert_message, row)
+
+    def mark_read(self, user_id, contact_id, last_read_at):
+        """Record the user's read position in a conversation. Returns a Future without waiting."""
+        return self.submit(self._mark_read, user_id, contact_id, last_read_at)
+
+
+class SupabaseRepository(Repository):
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.storage = client.storage
+
+    def _accepted_contacts(self, user_id):
+        rows = self.client.table("contacts").select("requester_id,requestee_id").or_(
+            f"requester_id.eq.{user_id},requestee_id.eq.{user_id}"
+        ).eq("status", "accepted").execute().data or []
+        return [r["requester_id"] if r["requester_id"] != user_id else r["requestee_id"] for r in rows]
+
+    def _conversation_inbox(self, user_id):
+        return self.client.rpc("conversation_inbox", {"uid": user_id}).execute().data or []
+
+    def _users(self, ids):
+        return self.client.table("users").select("id,email").in_("id", ids).execute().data or []
+
+    def _user_page(self, after, limit):
+        query = self.client.table("users").select("id,email")
+        if after is not None:
+            query = query.gt("id", after)
+        return query.order("id").limit(limit).execute().data or []
+
+    def _conversation_messages(self, user_id, contact_id, since, until, newest_first, limit):
+        query = self.client.table("messages").select("*").or_(conversation_filter(user_id, contact_id))
+        if since is not None:
+            query = query.gte("created_at", since)
+        if until is not None:
+            query = query.lte("created_at", until)
+        query = query.order("created_at", desc=newest_first)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data or []
+
+    def _insert_message(self, row):
+        return self.client.table("messages").insert(row).execute().data or []
+
+    def _mark_read(self, user_id, contact_id, last_read_at):
+        self.client.table("message_reads").upsert(
+            {"user_id": user_id, "contact_id": contact_id, "last_read_at": last_read_at}
+        ).execute()
+
+
+class InMemoryRepository(Repository):
+    """The same queries over in-process tables.
+
+    `latency` delays every query and `fail_next` makes that many upcoming
+    queries raise ConnectionError, to exercise timeouts and retries.
+    """
+
+    def __init__(self, storage=None, latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.storage = storage
+        self.latency = latency
+        self.fail_next = 0
+        self.tables = {"users": [], "contacts": [], "messages": [], "message_reads": {}}
+        self.query_count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _query(self):
+        with self._lock:
+            self.query_count += 1
+            failing = self.fail_next > 0
+            if failing:
+                self.fail_next -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failing:
+            raise ConnectionError("simulated network failure")
+
+    def _accepted_contacts(self, user_id):
+        self._query()
+        return [
+            c["requester_id"] if c["requester_id"] != user_id else c["requestee_id"]
+            for c in self.tables["contacts"]
+            if c["status"] == "accepted" and user_id in (c["requester_id"], c["requestee_id"])
+        ]
+
+    def _conversation_inbox(self, user_id):
+        contact_ids = self._accepted_contacts(user_id)
+        reads = self.tables["message_reads"]
+        last, unread = {}, {}
+        for m in self.tables["messages"]:
+            if m["receiver_id"] == user_id:
+                contact_id = m["sender_id"]
+                if m["created_at"] > reads.get((user_id, contact_id), ""):
+                    unread[contact_id] = unread.get(contact_id, 0) + 1
+            elif m["sender_id"] == user_id:
+                contact_id = m["receiver_id"]
+            else:
+                continue
+            if contact_id not in last or m["created_at"] >= last[contact_id]["created_at"]:
+                last[contact_id] = m
+        rows = []
+        for contact_id in contact_ids:
+            m = last.get(contact_id, {})
+            rows.append({
+                "contact_id": contact_id,
+                "last_text": m.get("text"),
+                "last_media_type": m.get("media_type"),
+                "last_sender_id": m.get("sender_id"),
+                "last_at": m.get("created_at"),
+                "unread_count": unread.get(contact_id, 0),
+            })
+        return rows
+
+    def _users(self, ids):
+        self._query()
+        wanted = set(ids)
+        return [dict(u) for u in self.tables["users"] if u["id"] in wanted]
+
+    def _user_page(self, after, limit):
+        self._query()
+        rows = sorted((u for u in self.tables["users"] if after is None or u["id"] > after), key=lambda u: u["id"])
+        return [dict(u) for u in rows[:limit]]
+
+    def _conversation_messages(self, user_id, contact_id, since, until, newest_first, limit):
+        self._query()
+        pair = {user_id, contact_id}
+        rows = [
+            dict(m) for m in self.tables["messages"]
+            if {m["sender_id"], m["receiver_id"]} == pair
+            and (since is None or m["created_at"] >= since)
+            and (until is None or m["created_at"] <= until)
+        ]
+        rows.sort(key=lambda m: m["created_at"], reverse=newest_first)
+        return rows if limit is None else rows[:limit]
+
+    def _insert_message(self, row):
+        self._query()
+        stored = {"media_url": None, "media_type": None, **row}
+        with self._lock:
+            stored.setdefault("id", next(self._ids))
+            stored.setdefault("created_at", _utc_now())
+            self.tables["messages"].append(stored)
+        return [dict(stored)]
+
+    def _mark_read(self, user_id, contact_id, last_read_at):
+        self._query()
+        self.tables["message_reads"][(user_id, contact_id)] = last_read_at
+
+
+_memory_repositories = {}
+_memory_lock = threading.Lock()
+
+
+def memory_repository(url, **kwargs):
+    """The process-wide InMemoryRepository for a memory:// URL, created with kwargs on first use.
+
+    Shared so that whoever seeds the tables (a benchmark, a local demo) and
+    the app see the same data.
+    """
+    with _memory_lock:
+        if url not in _memory_repositories:
+            _memory_repositories[url] = InMemoryRepository(**kwargs)
+        return _memory_repositories[url]
@@ -0,0 +1,174 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# ---------- Diagram Render Cache ----------
+# Laid-out SVGs keyed by a hash of their DOT source. Shared by every session
+# in the process, so an identical diagram is laid out once no matter how
+# many users saved it or how often the History tab reruns.
+
+RENDER_CACHE_MAX_ENTRIES = 512
+RENDER_WORKERS = 2
+RENDER_TIMEOUT = 5   # seconds a rerun waits for a layout before falling back
+
+
+def dot_key(dot):
+    return hashlib.sha256(dot.encode("utf-8")).hexdigest()
+
+
+def layout_svg(dot):
+    import graphviz
+
+    svg = graphviz.Source(dot).pipe(format="svg", encoding="utf-8")
+    # Drop the XML prolog/doctype so the markup can be embedded inline.
+    return svg[svg.find("<svg"):]
+
+
+class RenderCache:
+    def __init__(self, max_entries=RENDER_CACHE_MAX_ENTRIES, workers=RENDER_WORKERS, layout=layout_svg):
+        self.max_entries = max_entries
+        self.layout = layout
+        self._svgs = OrderedDict()   # key -> svg, least recently used first
+        self._pending = {}           # key -> Future, so concurrent misses lay out once
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="graphviz-render")
+
+    def get(self, dot):
+        key = dot_key(dot)
+        with self._lock:
+            svg = self._svgs.get(key)
+            if svg is not None:
+                self._svgs.move_to_end(key)
+            return svg
+
+    def render(self, dot, timeout=RENDER_TIMEOUT):
+        """Return the SVG for dot, laying it out (once) on a miss.
+
+        Returns None if the layout is not done within timeout seconds; it keeps
+        running in the background and is cached when it finishes.
+        """
+        svg = self.get(dot)
+        if svg is not None:
+            return svg
+        try:
+            return self._submit(dot).result(timeout)
+        except FutureTimeout:
+            return None
+
+    def prerender(self, dot):
+        """Lay out dot in the background; returns immediately."""
+        if self.get(dot) is None:
+            self._submit(dot)
+
+    def _submit(self, dot):
+        key = dot_key(dot)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._layout, key, dot)
+                self._pending[key] = future
+        return future
+
+    def _layout(self, key, dot):
+        try:
+            svg = self.layout(dot)
+            with self._lock:
+                self._svgs[key] = svg
+                self._svgs.move_to_end(key)
+                while len(self._svgs) > self.max_entries:
+                    self._svgs.popitem(last=False)
+            return svg
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+
+# ---------- Network Graph Model ----------
+# Ecomap and Social Network builders keep nodes and edges in dicts keyed by
+# id, so re-adding a connection updates it in place instead of appending
+# duplicate DOT statements. DOT text is produced only when rendering.
+
+RELATION_COLORS = {"Positive": "green", "Negative": "red", "Complicated": "orange"}
+RELATION_STYLES = {"Positive": "solid", "Negative": "dashed", "Complicated": "bold"}
+RELATION_LABELS = {"Positive": "─────", "Negative": "⸺⸺⸺", "Complicated": "/\\/\\/\\/"}
+
+
+def connection_attrs(relation, entity_type):
+    """Node and edge attributes for a connection, as drawn by the Ecomap/Social Network tools."""
+    node_attrs = {"shape": "circle" if entity_type == "Person" else "box", "color": RELATION_COLORS[relation]}
+    edge_attrs = {"color": RELATION_COLORS[relation], "label": RELATION_LABELS[relation], "style": RELATION_STYLES[relation]}
+    return node_attrs, edge_attrs
+
+
+class NetworkGraph:
+    def __init__(self):
+        self.nodes = {}    # node id -> attrs
+        self.edges = {}    # (id, id) sorted pair -> (tail, head, attrs); one connection per pair
+        self._degree = {}  # node id -> number of edges touching it
+
+    def upsert_node(self, node_id, **attrs):
+        self.nodes.setdefault(node_id, {}).update(attrs)
+        self._degree.setdefault(node_id, 0)
+
+    def upsert_edge(self, tail, head, **attrs):
+        key = tuple(sorted((tail, head)))
+        if key not in self.edges:
+            self._degree[tail] = self._degree.get(tail, 0) + 1
+            self._degree[head] = self._degree.get(head, 0) + 1
+        self.edges[key] = (tail, head, attrs)
+
+    def add_connection(self, center, name, outgoing, node_attrs, edge_attrs):
+        self.upsert_node(center, shape="circle", color="blue")
+        self.upsert_node(name, **node_attrs)
+        if outgoing:
+            self.upsert_edge(center, name, **edge_attrs)
+        else:
+            self.upsert_edge(name, center, **edge_attrs)
+
+    def remove_connection(self, a, b):
+        """Drop the edge between a and b, and either node once nothing connects to it."""
+        if self.edges.pop(tuple(sorted((a, b))), None) is None:
+            return False
+        for node_id in (a, b):
+            self._degree[node_id] -= 1
+            if self._degree[node_id] == 0:
+                del self._degree[node_id]
+                self.nodes.pop(node_id, None)
+        return True
+
+    def neighbours(self, node_id):
+        return [head if tail == node_id else tail for tail, head, _ in self.edges.values() if node_id in (tail, head)]
+
+    def to_dot(self):
+        import graphviz
+
+        dot = graphviz.Digraph()
+        for node_id, attrs in self.nodes.items():
+            dot.node(node_id, node_id, **attrs)
+        for tail, head, attrs in self.edges.values():
+            dot.edge(tail, head, **attrs)
+        return dot.source
+
+    def to_dict(self):
+        return {"nodes": self.nodes, "edges": [[tail, head, attrs] for tail, head, attrs in self.edges.values()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        graph = cls()
+        for node_id, attrs in data.get("nodes", {}).items():
+            graph.upsert_node(node_id, **attrs)
+        for tail, head, attrs in data.get("edges", []):
+            graph.upsert_edge(tail, head, **attrs)
+        return graph
+
+
+def history_dot(payload):
+    """DOT source for a saved diagram, whether stored as a model or as raw DOT."""
+    if "genogram" in payload:
+        from genogram import Genogram
+
+        return Genogram.from_dict(payload["genogram"]).to_dot()
+    if "graph" in payload:
+        return NetworkGraph.from_dict(payload["graph"]).to_dot()
+    return payload["dot"]
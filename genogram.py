@@ -0,0 +1,251 @@
+# ---------- Genogram Model ----------
+# People and unions (marriages / partnerships) keyed by generated ids, so
+# relatives with the same name never collide. Every person carries a
+# generation rank used to line generations up in the layout. DOT statements
+# are cached per person and per union, so an edit only rebuilds the text of
+# the statements it touches. The layout itself is not incremental: any edit
+# changes the full DOT, so Graphviz lays the whole tree out again.
+
+GENDER_STYLES = {
+    "M": {"shape": "box", "fillcolor": "lightblue"},
+    "F": {"shape": "ellipse", "fillcolor": "pink"},
+    "U": {"shape": "diamond", "fillcolor": "lightgrey"},
+}
+GENDER_LABELS = {"M": "Male", "F": "Female", "U": "Unknown"}
+RELATIONS = ["Child of", "Parent of", "Partner of", "Sibling of"]
+
+
+def _quote(text):
+    return '"' + str(text).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class Genogram:
+    def __init__(self):
+        self.people = {}        # person id -> {"name", "gender", "generation"}
+        self.unions = {}        # union id -> {"partners": [...], "children": [...], "kind"}
+        self.parent_union = {}  # person id -> union id they were born into
+        self.partner_unions = {}  # person id -> union ids they are a partner in
+        self._next_id = 1
+        self._statements = {}   # person/union id -> cached DOT statement text
+        self._generations = {}  # generation -> set of person ids
+
+    def _new_id(self, prefix):
+        new_id = f"{prefix}{self._next_id}"
+        self._next_id += 1
+        return new_id
+
+    # --- people ---
+    def add_person(self, name, gender="U", generation=0):
+        pid = self._new_id("p")
+        self.people[pid] = {"name": name, "gender": gender if gender in GENDER_STYLES else "U", "generation": generation}
+        self.partner_unions[pid] = []
+        self._generations.setdefault(generation, set()).add(pid)
+        return pid
+
+    def edit_person(self, pid, name=None, gender=None):
+        person = self.people[pid]
+        if name:
+            person["name"] = name
+        if gender in GENDER_STYLES:
+            person["gender"] = gender
+        self._statements.pop(pid, None)
+
+    def remove_person(self, pid):
+        if len(self.people) == 1 and pid in self.people:
+            raise ValueError("A genogram needs at least one person.")
+        person = self.people.pop(pid)
+        self._generations[person["generation"]].discard(pid)
+        self._statements.pop(pid, None)
+        born_into = self.parent_union.pop(pid, None)
+        if born_into:
+            self.unions[born_into]["children"].remove(pid)
+            self._touch_union(born_into)
+        for uid in self.partner_unions.pop(pid):
+            self.unions[uid]["partners"].remove(pid)
+            self._touch_union(uid)
+
+    def find(self, name):
+        return [pid for pid, person in self.people.items() if person["name"] == name]
+
+    # --- unions ---
+    def add_union(self, partners, kind="marriage"):
+        uid = self._new_id("u")
+        self.unions[uid] = {"partners": list(partners), "children": [], "kind": kind}
+        for pid in partners:
+            self.partner_unions[pid].append(uid)
+        return uid
+
+    def add_child(self, uid, name, gender="U"):
+        union = self.unions[uid]
+        if union["partners"]:
+            generation = self.people[union["partners"][0]]["generation"] + 1
+        elif union["children"]:
+            # Parents not recorded yet: stay on the siblings' generation.
+            generation = self.people[union["children"][0]]["generation"]
+        else:
+            generation = 0
+        pid = self.add_person(name, gender, generation)
+        union["children"].append(pid)
+        self.parent_union[pid] = uid
+        self._touch_union(uid)
+        return pid
+
+    def _touch_union(self, uid):
+        union = self.unions[uid]
+        if not union["partners"] and not union["children"]:
+            del self.unions[uid]
+        self._statements.pop(uid, None)
+
+    def add_relative(self, relation, pid, name, gender="U"):
+        """Add a new person related to an existing one; returns the new person id."""
+        generation = self.people[pid]["generation"]
+        if relation == "Child of":
+            uid = next(iter(self.partner_unions[pid]), None) or self.add_union([pid])
+            return self.add_child(uid, name, gender)
+        if relation == "Partner of":
+            new_pid = self.add_person(name, gender, generation)
+            self.add_union([pid, new_pid])
+            return new_pid
+        if relation == "Parent of":
+            uid = self.parent_union.get(pid)
+            if uid is None:
+                uid = self.add_union([])
+                self.unions[uid]["children"].append(pid)
+                self.parent_union[pid] = uid
+            elif len(self.unions[uid]["partners"]) >= 2:
+                raise ValueError(f"{self.people[pid]['name']} already has two parents.")
+            new_pid = self.add_person(name, gender, generation - 1)
+            self.unions[uid]["partners"].append(new_pid)
+            self.partner_unions[new_pid].append(uid)
+            self._touch_union(uid)
+            return new_pid
+        if relation == "Sibling of":
+            uid = self.parent_union.get(pid)
+            if uid is None:
+                uid = self.add_union([])
+                self.unions[uid]["children"].append(pid)
+                self.parent_union[pid] = uid
+            return self.add_child(uid, name, gender)
+        raise ValueError(f"Unknown relation: {relation}")
+
+    def rank_generations(self):
+        """Recompute every generation rank from the union graph (used after bulk import)."""
+        generation = {pid: 0 for pid in self.people if pid not in self.parent_union}
+        waiting = {uid: sum(1 for pid in union["partners"] if pid not in generation) for uid, union in self.unions.items()}
+        ready = [uid for uid, count in waiting.items() if count == 0]
+        while ready:
+            union = self.unions[ready.pop()]
+            base = max((generation[pid] for pid in union["partners"]), default=None)
+            if base is None:
+                base = -1
+            for pid in union["partners"]:
+                if pid not in self.parent_union:
+                    generation[pid] = base  # married in: align with the partner
+            for child in union["children"]:
+                if child in generation:
+                    continue
+                generation[child] = base + 1
+                for uid in self.partner_unions[child]:
+                    waiting[uid] -= 1
+                    if waiting[uid] == 0:
+                        ready.append(uid)
+        self._generations = {}
+        for pid, person in self.people.items():
+            # People only reachable through a cycle keep generation 0.
+            person["generation"] = generation.get(pid, 0)
+            self._generations.setdefault(person["generation"], set()).add(pid)
+
+    # --- rendering ---
+    def _person_statement(self, pid):
+        if pid not in self._statements:
+            person = self.people[pid]
+            style = GENDER_STYLES[person["gender"]]
+            self._statements[pid] = (
+                f'\t{pid} [label={_quote(person["name"])} shape={style["shape"]} style=filled fillcolor={style["fillcolor"]}]'
+            )
+        return self._statements[pid]
+
+    def _union_statement(self, uid):
+        if uid not in self._statements:
+            union = self.unions[uid]
+            lines = [f"\t{uid} [label=\"\" shape=point width=0.08]"]
+            edge_style = "dir=none" if union["kind"] == "marriage" else "dir=none style=dashed"
+            lines += [f"\t{pid} -> {uid} [{edge_style}]" for pid in union["partners"]]
+            lines += [f"\t{uid} -> {pid}" for pid in union["children"]]
+            self._statements[uid] = "\n".join(lines)
+        return self._statements[uid]
+
+    def to_dot(self):
+        lines = ["digraph {", "\trankdir=TB", "\tnode [fontsize=10]"]
+        lines += [self._person_statement(pid) for pid in self.people]
+        lines += [self._union_statement(uid) for uid in self.unions]
+        for generation in sorted(self._generations):
+            members = sorted(self._generations[generation])
+            if members:
+                lines.append("\t{rank=same; " + " ".join(members) + "}")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def generation_count(self):
+        return sum(1 for members in self._generations.values() if members)
+
+    # --- persistence ---
+    def to_dict(self):
+        return {"people": self.people, "unions": self.unions, "next_id": self._next_id}
+
+    @classmethod
+    def from_dict(cls, data):
+        genogram = cls()
+        genogram._next_id = data.get("next_id", 1)
+        for pid, person in data.get("people", {}).items():
+            genogram.people[pid] = dict(person)
+            genogram.partner_unions[pid] = []
+            genogram._generations.setdefault(person["generation"], set()).add(pid)
+        for uid, union in data.get("unions", {}).items():
+            genogram.unions[uid] = {"partners": list(union["partners"]), "children": list(union["children"]), "kind": union.get("kind", "marriage")}
+            for pid in union["partners"]:
+                genogram.partner_unions[pid].append(uid)
+            for pid in union["children"]:
+                genogram.parent_union[pid] = uid
+        return genogram
+
+
+def split_names(text):
+    return [name.strip() for name in text.split(",") if name.strip()]
+
+
+def genogram_from_form(fields):
+    """Seed a genogram from the quick-entry form (blank fields are skipped).
+
+    A blank Father or Mother still gets an "Unknown father/mother" placeholder
+    when grandparents, aunts or uncles were entered on that side.
+    """
+    genogram = Genogram()
+    you = genogram.add_person(fields["user_name"] or "You", "U", 0)
+    parents = genogram.add_union([])
+    genogram.unions[parents]["children"].append(you)
+    genogram.parent_union[you] = parents
+    for side, parent_key, gender in (("paternal", "father", "M"), ("maternal", "mother", "F")):
+        side_keys = (f"{side}_grandfather", f"{side}_grandmother", f"{side}_aunts", f"{side}_uncles")
+        if not fields[parent_key] and not any(fields[key].strip() for key in side_keys):
+            continue
+        parent = genogram.add_relative("Parent of", you, fields[parent_key] or f"Unknown {parent_key}", gender)
+        for key, grand_gender in ((f"{side}_grandfather", "M"), (f"{side}_grandmother", "F")):
+            if fields[key]:
+                genogram.add_relative("Parent of", parent, fields[key], grand_gender)
+        for name in split_names(fields[f"{side}_aunts"]):
+            genogram.add_relative("Sibling of", parent, name, "F")
+        for name in split_names(fields[f"{side}_uncles"]):
+            genogram.add_relative("Sibling of", parent, name, "M")
+    for name in split_names(fields["user_siblings"]):
+        genogram.add_relative("Sibling of", you, name, "U")
+    if fields["user_spouse"]:
+        spouse = genogram.add_relative("Partner of", you, fields["user_spouse"], "U")
+        family = genogram.partner_unions[spouse][0]
+    else:
+        family = None
+    for name in split_names(fields["user_children"]):
+        if family is None:
+            family = genogram.add_union([you])
+        genogram.add_child(family, name, "U")
+    return genogram
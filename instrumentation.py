@@ -0,0 +1,175 @@
+import contextvars
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# ---------- Rerun Instrumentation ----------
+# A RerunProfile collects timed spans for one script run (or fragment run):
+# sections, backend queries, SQLite calls, file I/O and heavy compute. The
+# active profile lives in a context variable. When no profile is active, a
+# span costs one ContextVar lookup, so instrumentation is cheap when it is
+# turned off. Finished profiles are shown in the admin debug panel, added
+# to process-wide totals and optionally logged as one JSON line each.
+
+PERF_LOGGER = "jalinan.perf"
+
+_active = contextvars.ContextVar("rerun_profile", default=None)
+logger = logging.getLogger(PERF_LOGGER)
+
+
+class RerunProfile:
+    def __init__(self, name, session=None):
+        self.name = name
+        self.session = session
+        self.started_at = time.time()
+        self.spans = []           # (kind, name, ms); appended from worker threads too
+        self.total_ms = None
+        self._start = time.perf_counter()
+
+    def add(self, kind, name, ms):
+        self.spans.append((kind, name, ms))
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+        return self
+
+    def totals(self):
+        """{(kind, name): [count, total_ms]} for this run."""
+        totals = defaultdict(lambda: [0, 0.0])
+        for kind, name, ms in list(self.spans):
+            totals[(kind, name)][0] += 1
+            totals[(kind, name)][1] += ms
+        return dict(totals)
+
+    def to_record(self):
+        by_kind = defaultdict(lambda: {"count": 0, "ms": 0.0})
+        for kind, _, ms in list(self.spans):
+            by_kind[kind]["count"] += 1
+            by_kind[kind]["ms"] += ms
+        return {
+            "run": self.name,
+            "session": self.session,
+            "started_at": self.started_at,
+            "total_ms": round(self.total_ms or 0, 2),
+            "kinds": {kind: {"count": v["count"], "ms": round(v["ms"], 2)} for kind, v in by_kind.items()},
+            "spans": [{"kind": kind, "name": name, "count": count, "ms": round(ms, 2)}
+                      for (kind, name), (count, ms) in self.totals().items()],
+        }
+
+
+class ProcessMetrics:
+    """Counts and total time per (kind, name) across every profiled run in the process."""
+
+    def __init__(self):
+        self._totals = defaultdict(lambda: [0, 0.0])
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def record(self, profile):
+        with self._lock:
+            self.runs += 1
+            for key, (count, ms) in profile.totals().items():
+                self._totals[key][0] += count
+                self._totals[key][1] += ms
+
+    def snapshot(self):
+        with self._lock:
+            return [{"kind": kind, "name": name, "count": count, "total_ms": round(ms, 2), "mean_ms": round(ms / count, 3)}
+                    for (kind, name), (count, ms) in sorted(self._totals.items())]
+
+
+def configure_perf_log(target):
+    """Send finished profiles to stderr ("stderr") or append them to a file, one JSON object per line."""
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr) if target == "stderr" else logging.FileHandler(target, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class _Span:
+    __slots__ = ("profile", "kind", "name", "start")
+
+    def __init__(self, profile, kind, name):
+        self.profile = profile
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add(self.kind, self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(kind, name):
+    """Context manager timing its block into the active profile (a shared no-op when there is none)."""
+    profile = _active.get()
+    return _NO_SPAN if profile is None else _Span(profile, kind, name)
+
+
+def timed(kind, name=None):
+    """Decorator form of span(); the name defaults to the function name."""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profile = _active.get()
+            if profile is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.add(kind, label, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def profiled_run(name, enabled, session=None, metrics=None, log=False, on_finish=None):
+    """Profile the block as one run, or as a section span when a run is already being profiled.
+
+    Fragments call this too, so a fragment-only rerun gets its own profile.
+    """
+    if _active.get() is not None:
+        with span("section", name):
+            yield
+        return
+    if not enabled:
+        yield
+        return
+    profile = RerunProfile(name, session)
+    token = _active.set(profile)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+        profile.finish()
+        if metrics is not None:
+            metrics.record(profile)
+        if log:
+            logger.info(json.dumps(profile.to_record()))
+        if on_finish is not None:
+            on_finish(profile)
@@ -0,0 +1,179 @@
+import csv
+import io
+from datetime import datetime
+
+from diagrams import RELATION_COLORS, NetworkGraph, connection_attrs
+from genogram import Genogram
+
+# ---------- Bulk Import / Export ----------
+# GEDCOM family files become Genogram history entries and CSV edge lists
+# become Ecomap / Social Network entries. Input is read line by line (never
+# as one string) and finished entries are written to history in batched
+# transactions; exports are generated line by line from the saved models.
+
+IMPORT_BATCH_SIZE = 50       # history entries per INSERT transaction
+CSV_COLUMNS = ["map", "source", "target", "relation", "entity_type", "center"]
+CENTER_ATTRS = {"shape": "circle", "color": "blue"}  # the user node the Ecomap/Social tools draw
+
+
+def text_lines(uploaded_file, encoding="utf-8-sig"):
+    """Iterate the lines of an uploaded (binary) file without reading it whole."""
+    return io.TextIOWrapper(uploaded_file, encoding=encoding, errors="replace", newline="")
+
+
+# --- GEDCOM ---
+def iter_gedcom_records(lines):
+    """Yield one dict per level-0 record: {"xref", "tag", "fields": [(tag, value), ...]}."""
+    record = None
+    for line in lines:
+        parts = line.strip().split(" ", 2)
+        if len(parts) < 2 or not parts[0].isdigit():
+            continue
+        level = int(parts[0])
+        if level == 0:
+            if record is not None:
+                yield record
+            if parts[1].startswith("@"):
+                record = {"xref": parts[1], "tag": parts[2].strip() if len(parts) > 2 else "", "fields": []}
+            else:
+                record = {"xref": None, "tag": parts[1], "fields": []}
+        elif level == 1 and record is not None:
+            record["fields"].append((parts[1], parts[2] if len(parts) > 2 else ""))
+    if record is not None:
+        yield record
+
+
+def genogram_from_gedcom(lines):
+    """Build a Genogram from GEDCOM INDI/FAM records, streaming the input."""
+    genogram = Genogram()
+    people = {}  # GEDCOM xref -> person id
+
+    def person(xref):
+        if xref not in people:
+            # Referenced by a family before (or without) its INDI record.
+            people[xref] = genogram.add_person(xref.strip("@"))
+        return people[xref]
+
+    for record in iter_gedcom_records(lines):
+        fields = record["fields"]
+        if record["tag"] == "INDI":
+            pid = person(record["xref"])
+            for tag, value in fields:
+                if tag == "NAME" and value:
+                    genogram.edit_person(pid, name=" ".join(value.replace("/", " ").split()))
+                elif tag == "SEX":
+                    genogram.edit_person(pid, gender=value.strip().upper()[:1])
+        elif record["tag"] == "FAM":
+            partners = [person(value.strip()) for tag, value in fields if tag in ("HUSB", "WIFE")]
+            uid = genogram.add_union(partners)
+            for tag, value in fields:
+                if tag != "CHIL":
+                    continue
+                pid = person(value.strip())
+                if pid not in genogram.parent_union:
+                    genogram.unions[uid]["children"].append(pid)
+                    genogram.parent_union[pid] = uid
+    genogram.rank_generations()
+    return genogram
+
+
+def genogram_to_gedcom(data):
+    """Yield GEDCOM 5.5.1 lines for a saved genogram model."""
+    genogram = Genogram.from_dict(data)
+    yield "0 HEAD"
+    yield "1 SOUR JalinanInsan"
+    yield "1 GEDC"
+    yield "2 VERS 5.5.1"
+    yield "1 CHAR UTF-8"
+    for pid, person in genogram.people.items():
+        yield f"0 @{pid}@ INDI"
+        yield f"1 NAME {person['name']}"
+        yield f"1 SEX {person['gender']}"
+        if pid in genogram.parent_union:
+            yield f"1 FAMC @{genogram.parent_union[pid]}@"
+        for uid in genogram.partner_unions[pid]:
+            yield f"1 FAMS @{uid}@"
+    for uid, union in genogram.unions.items():
+        yield f"0 @{uid}@ FAM"
+        partners = sorted(union["partners"], key=lambda pid: genogram.people[pid]["gender"] != "M")
+        for tag, pid in zip(("HUSB", "WIFE"), partners):
+            yield f"1 {tag} @{pid}@"
+        for pid in union["children"]:
+            yield f"1 CHIL @{pid}@"
+    yield "0 TRLR"
+
+
+# --- CSV edge lists ---
+# `entity_type` and `relation` style the node that is not the center; the
+# optional `center` column names the endpoint drawn as the user, so an
+# exported map imports back as it was. Without it both ends are plain nodes.
+def graphs_from_csv(lines, default_title):
+    """Yield (title, NetworkGraph) per map. Rows of one map are expected to be contiguous."""
+    title, graph = None, None
+    for row in csv.DictReader(lines):
+        source, target = (row.get("source") or "").strip(), (row.get("target") or "").strip()
+        if not source or not target:
+            continue
+        row_title = (row.get("map") or "").strip() or default_title
+        if row_title != title:
+            if graph is not None:
+                yield title, graph
+            title, graph = row_title, NetworkGraph()
+        relation = (row.get("relation") or "Positive").strip().capitalize()
+        node_attrs, edge_attrs = connection_attrs(relation if relation in RELATION_COLORS else "Positive",
+                                                  (row.get("entity_type") or "Person").strip())
+        center = (row.get("center") or "").strip()
+        other = source if center == target else target
+        if center in (source, target):
+            graph.upsert_node(center, **CENTER_ATTRS)
+        else:
+            graph.upsert_node(source)
+        graph.upsert_node(other, **node_attrs)
+        graph.upsert_edge(source, target, **edge_attrs)
+    if graph is not None:
+        yield title, graph
+
+
+def graph_to_csv(title, data):
+    """Yield CSV lines for a saved Ecomap / Social Network model."""
+    relation_by_color = {color: relation for relation, color in RELATION_COLORS.items()}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    nodes = data.get("nodes", {})
+    centers = {node_id for node_id, attrs in nodes.items() if attrs == CENTER_ATTRS}
+    for tail, head, attrs in data.get("edges", []):
+        center = head if head in centers and tail not in centers else tail if tail in centers else ""
+        other = tail if center == head else head
+        entity_type = "Person" if nodes.get(other, {}).get("shape") == "circle" else "Other"
+        writer.writerow([title, tail, head, relation_by_color.get(attrs.get("color"), "Positive"), entity_type, center])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+# --- writing into history ---
+def import_entries(user_data, entries, batch_size=IMPORT_BATCH_SIZE):
+    """Save history entries from an iterator in batched transactions; returns the count saved."""
+    batch, saved = [], 0
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            user_data.add_history_batch(batch)
+            saved += len(batch)
+            batch = []
+    if batch:
+        user_data.add_history_batch(batch)
+        saved += len(batch)
+    return saved
+
+
+def gedcom_entries(lines, title):
+    genogram = genogram_from_gedcom(lines)
+    yield {"type": "Genogram", "title": title, "genogram": genogram.to_dict(), "timestamp": str(datetime.now())}
+
+
+def csv_entries(lines, entry_type, default_title):
+    for title, graph in graphs_from_csv(lines, default_title):
+        yield {"type": entry_type, "title": title, "graph": graph.to_dict(), "timestamp": str(datetime.now())}
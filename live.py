@@ -0,0 +1,205 @@
+import asyncio
+import functools
+import threading
+import time
+import weakref
+from collections import Counter, deque
+
+# ---------- Live Message Delivery ----------
+# Event sources push newly inserted `messages` rows to subscribers keyed by
+# receiver id. A LiveInbox per session buffers them so the chat fragment can
+# drain the buffer instead of re-querying Supabase on every refresh.
+# Pushes are only trusted while a realtime subscription is confirmed, and
+# even then the open conversation is re-synced every few refreshes: rows
+# can be missed (a dropped socket, the user's own messages sent from
+# another device), and the in-process source never sees other processes.
+
+LIVE_REFRESH_SECONDS = 2     # how often the chat fragment drains its inbox
+LIVE_POLL_SECONDS = 20       # how often it re-queries instead while realtime is not confirmed
+LIVE_SYNC_EVERY = 5          # refreshes between backend syncs while pushes are trusted
+REALTIME_CONNECT_TIMEOUT = 10  # seconds to open the realtime socket and join a channel
+INBOX_MAX_PENDING = 500      # rows buffered per session between drains
+INBOX_RESEED_SECONDS = 60    # how long a seeded inbox is trusted before re-reading contacts
+
+
+class LocalEventSource:
+    """In-process stand-in for Supabase Realtime; also used when realtime is unavailable."""
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> list of weak callbacks
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, callback):
+        ref = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else (lambda: callback)
+        with self._lock:
+            self._subscribers.setdefault(user_id, []).append(ref)
+        self._on_first_subscriber(user_id)
+
+    def publish(self, row):
+        receiver = row.get("receiver_id")
+        with self._lock:
+            # Drop subscriptions whose session has been garbage collected.
+            refs = [ref for ref in self._subscribers.get(receiver, ()) if ref() is not None]
+            if receiver in self._subscribers:
+                self._subscribers[receiver] = refs
+        for ref in refs:
+            callback = ref()
+            if callback is not None:
+                callback(row)
+
+    def notify_sent(self, row):
+        """Called after this process inserts a message; locally that is the only delivery path."""
+        self.publish(row)
+
+    def subscribed(self, user_id):
+        """Whether pushes for user_id include messages inserted by other processes."""
+        return False
+
+    def error(self, user_id):
+        """Why the subscription for user_id failed, or None."""
+        return None
+
+    def _on_first_subscriber(self, user_id):
+        pass
+
+
+class SupabaseRealtimeSource(LocalEventSource):
+    """Listens for INSERTs on `messages` over Supabase Realtime on a background event loop."""
+
+    def __init__(self, url, key):
+        super().__init__()
+        self.url = url
+        self.key = key
+        self._channels = set()
+        self._subscribed = set()
+        self._errors = {}         # user_id -> exception from the last failed subscription
+        self._loop = asyncio.new_event_loop()
+        self._client = None
+        threading.Thread(target=self._loop.run_forever, name="supabase-realtime", daemon=True).start()
+
+    def _on_first_subscriber(self, user_id):
+        with self._lock:
+            if user_id in self._channels:
+                return
+            self._channels.add(user_id)
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(self._listen(user_id), REALTIME_CONNECT_TIMEOUT), self._loop)
+        future.add_done_callback(functools.partial(self._listen_done, user_id))
+
+    def notify_sent(self, row):
+        # Realtime echoes the INSERT back to the receiver's subscription.
+        pass
+
+    def subscribed(self, user_id):
+        with self._lock:
+            return user_id in self._subscribed
+
+    def error(self, user_id):
+        with self._lock:
+            return self._errors.get(user_id)
+
+    def _listen_done(self, user_id, future):
+        if not future.cancelled() and future.exception() is not None:
+            self._failed(user_id, future.exception())
+
+    def _on_state(self, user_id, state, error):
+        if getattr(state, "value", state) == "SUBSCRIBED":
+            with self._lock:
+                self._subscribed.add(user_id)
+                self._errors.pop(user_id, None)
+        else:
+            self._failed(user_id, error or ConnectionError(f"realtime channel {getattr(state, 'value', state)}"))
+
+    def _failed(self, user_id, error):
+        # Let a later subscription retry rather than leaving the user silently unsubscribed.
+        with self._lock:
+            self._channels.discard(user_id)
+            self._subscribed.discard(user_id)
+            self._errors[user_id] = error
+
+    async def _listen(self, user_id):
+        from supabase import acreate_client
+
+        if self._client is None:
+            self._client = await acreate_client(self.url, self.key)
+
+        def on_insert(payload):
+            record = (payload.get("data") or {}).get("record") or payload.get("new") or payload.get("record")
+            if record:
+                self.publish(record)
+
+        await self._client.channel(f"messages:{user_id}").on_postgres_changes(
+            "INSERT", schema="public", table="messages",
+            filter=f"receiver_id=eq.{user_id}", callback=on_insert,
+        ).subscribe(functools.partial(self._on_state, user_id))
+
+
+class LiveInbox:
+    """Per-session conversation list: last message and unread count per contact.
+
+    Seeded from the conversation_inbox query, then kept current from pushed
+    and sent messages instead of rescanning conversations. Re-seeded every
+    reseed_seconds so contacts accepted meanwhile show up; pushes from users
+    who are not contacts are ignored.
+    """
+
+    def __init__(self, user_id, max_pending=INBOX_MAX_PENDING, reseed_seconds=INBOX_RESEED_SECONDS):
+        self.user_id = user_id
+        self.reseed_seconds = reseed_seconds
+        self.unread = Counter()
+        self.conversations = {}   # contact id -> last message summary
+        self.contacts = frozenset()
+        self.seeded = False
+        self._seeded_at = None
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+
+    def attach(self, source):
+        source.subscribe(self.user_id, self.push)
+        return self
+
+    def seed(self, rows):
+        with self._lock:
+            self.conversations = {row["contact_id"]: row for row in rows}
+            self.unread = Counter({row["contact_id"]: row["unread_count"] for row in rows if row.get("unread_count")})
+            self.contacts = frozenset(self.conversations)
+            self.seeded = True
+            self._seeded_at = time.monotonic()
+
+    def stale(self):
+        """Whether the contacts should be re-read: never seeded, or seeded too long ago."""
+        return not self.seeded or time.monotonic() - self._seeded_at > self.reseed_seconds
+
+    def _record(self, contact_id, row):
+        summary = self.conversations.setdefault(contact_id, {"contact_id": contact_id})
+        if (summary.get("last_at") or "") <= row["created_at"]:
+            summary.update(last_text=row.get("text"), last_media_type=row.get("media_type"),
+                           last_sender_id=row["sender_id"], last_at=row["created_at"])
+
+    def push(self, row):
+        with self._lock:
+            if row["sender_id"] not in self.contacts:
+                return
+            self._pending.append(row)
+            self.unread[row["sender_id"]] += 1
+            self._record(row["sender_id"], row)
+
+    def record_sent(self, row):
+        with self._lock:
+            self._record(row["receiver_id"], row)
+
+    def drain(self):
+        with self._lock:
+            rows = list(self._pending)
+            self._pending.clear()
+        return rows
+
+    def mark_read(self, contact_id):
+        """Clear the contact's unread count; returns how many were unread."""
+        with self._lock:
+            return self.unread.pop(contact_id, 0)
+
+    def ordered(self):
+        """Conversations, most recent message first."""
+        with self._lock:
+            return sorted(self.conversations.values(), key=lambda c: c.get("last_at") or "", reverse=True)
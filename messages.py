@@ -0,0 +1,90 @@
+# ---------- Conversation Store ----------
+# Keeps a bounded window of one conversation in session state. Each rerun
+# only asks the repository for rows past the high-water mark (created_at, id);
+# older history is paged in on demand.
+
+MESSAGE_PAGE_SIZE = 50       # rows per "load earlier" page / per sync request
+MAX_WINDOW_MESSAGES = 200    # messages kept (and rendered) per conversation
+
+
+def _sort_key(message):
+    return (message["created_at"], str(message["id"]))
+
+
+class ConversationWindow:
+    def __init__(self, user_id, contact_id, page_size=MESSAGE_PAGE_SIZE, max_messages=MAX_WINDOW_MESSAGES):
+        self.user_id = user_id
+        self.contact_id = contact_id
+        self.page_size = page_size
+        self.max_messages = max_messages
+        self.messages = []          # ascending by (created_at, id)
+        self._ids = set()
+        self.loaded = False
+        self.has_earlier = False
+
+    @property
+    def newest(self):
+        return _sort_key(self.messages[-1]) if self.messages else None
+
+    @property
+    def oldest(self):
+        return _sort_key(self.messages[0]) if self.messages else None
+
+    def _query(self, repo, **bounds):
+        return repo.conversation_messages(self.user_id, self.contact_id, limit=self.page_size, **bounds)
+
+    def sync(self, repo):
+        """Fetch messages newer than the high-water mark. Returns the number of new rows."""
+        if not self.loaded:
+            rows = self._query(repo, newest_first=True)
+            self.loaded = True
+            self.has_earlier = len(rows) == self.page_size
+            return self.merge(rows)
+        if not self.messages:
+            rows = self._query(repo)
+            return self.merge(rows) + (self.sync(repo) if len(rows) == self.page_size else 0)
+        added = 0
+        while True:
+            # gte rather than gt: rows sharing the boundary timestamp are
+            # de-duplicated by id in merge().
+            rows = self._query(repo, since=self.newest[0])
+            new = self.merge(rows)
+            added += new
+            if len(rows) < self.page_size or new == 0:
+                return added
+
+    def load_earlier(self, repo):
+        """Page in one batch of history before the oldest loaded message."""
+        if not self.messages:
+            return 0
+        rows = self._query(repo, until=self.oldest[0], newest_first=True)
+        self.has_earlier = len(rows) == self.page_size
+        self.max_messages += self.page_size
+        return self.merge(rows)
+
+    def merge(self, rows):
+        """Insert rows not yet in the window (live pushes arrive here too)."""
+        new_rows = [r for r in rows if r["id"] not in self._ids]
+        if not new_rows:
+            return 0
+        self._ids.update(r["id"] for r in new_rows)
+        if self.messages and all(_sort_key(r) >= self.newest for r in new_rows):
+            self.messages.extend(sorted(new_rows, key=_sort_key))
+        else:
+            self.messages = sorted(self.messages + new_rows, key=_sort_key)
+        overflow = len(self.messages) - self.max_messages
+        if overflow > 0:
+            for r in self.messages[:overflow]:
+                self._ids.discard(r["id"])
+            del self.messages[:overflow]
+            self.has_earlier = True
+        return len(new_rows)
+
+
+def get_conversation_window(state, user_id, contact_id):
+    """Return the session's window for this conversation, creating it on first use."""
+    windows = state.setdefault("conversation_windows", {})
+    key = (user_id, contact_id)
+    if key not in windows:
+        windows[key] = ConversationWindow(user_id, contact_id)
+    return windows[key]
@@ -0,0 +1,119 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# ---------- Life Roadmap Engine ----------
+# Free-text times ("2023", "Age 25", "May 2019") are parsed once, when an
+# event is added, into a numeric sort key (fractional year); ages are parsed
+# again after the date of birth changes. Events are then
+# held column-wise in a typed DataFrame ordered by that key, and trends,
+# per-period totals and chart downsampling are plain vectorized pandas ops.
+
+ROADMAP_MAX_POINTS = 300     # chart points before the timeline is downsampled
+ROADMAP_COLUMNS = ["Time", "Key", "Event", "Impact"]
+PERIODS = {"Event": None, "Year": 1, "5 Years": 5, "Decade": 10}
+
+_AGE = re.compile(r"\bage\s*(\d{1,3})\b", re.IGNORECASE)
+_BARE_NUMBER = re.compile(r"^\s*(\d{1,3})\s*$")
+_YEAR = re.compile(r"\b(\d{4})\b")
+_NUMERIC_MONTH = re.compile(r"\b\d{4}[-/](\d{1,2})\b|\b(\d{1,2})[-/]\d{4}\b")
+# Whole month words only ("May 2019", "Sept. 2020"), so "Married 2019" or "Japan 2010" carry no month.
+_MONTH = re.compile(
+    r"\b(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|"
+    r"sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b",
+    re.IGNORECASE,
+)
+_MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+
+def birth_year(bio):
+    match = _YEAR.search(str(bio.get("dob", "")))
+    return int(match.group(1)) if match else None
+
+
+def parse_time(text, born=None):
+    """Return a sortable fractional year for a free-text time, or None if it has no date in it.
+
+    Ages become born + age when the birth year is known; otherwise the bare
+    age is used, which still orders ages among themselves.
+    """
+    text = str(text)
+    match = _AGE.search(text) or _BARE_NUMBER.match(text)
+    if match:
+        age = int(match.group(1))
+        return float(born + age) if born else float(age)
+    match = _YEAR.search(text)
+    if not match:
+        return None
+    year = float(match.group(1))
+    numeric = _NUMERIC_MONTH.search(text)
+    if numeric:
+        month = int(numeric.group(1) or numeric.group(2))
+    else:
+        named = _MONTH.search(text)
+        month = _MONTHS.index(named.group(1)[:3].lower()) + 1 if named else None
+    if month and 1 <= month <= 12:
+        year += (month - 1) / 12
+    return year
+
+
+def roadmap_frame(rows):
+    """Typed, key-ordered frame from (time, event, impact, key) rows."""
+    times, events, impacts, keys = [], [], [], []
+    for time, event, impact, key in rows:
+        times.append(time)
+        events.append(event)
+        impacts.append(impact)
+        keys.append(np.nan if key is None else key)
+    df = pd.DataFrame({
+        "Time": pd.Series(times, dtype="string"),
+        "Key": np.asarray(keys, dtype="float64"),
+        "Event": pd.Series(events, dtype="string"),
+        "Impact": np.asarray(impacts, dtype="int16"),
+    })
+    # Stable sort keeps entry order for equal keys; undated events go last.
+    return df.sort_values("Key", kind="stable", na_position="last", ignore_index=True)
+
+
+def frame_to_columns(df):
+    return {col: df[col].astype(object).where(df[col].notna(), None).tolist() for col in ROADMAP_COLUMNS}
+
+
+def frame_from_columns(columns):
+    return roadmap_frame(zip(columns["Time"], columns["Event"], columns["Impact"], columns["Key"]))
+
+
+def legacy_frame(data, born=None):
+    """Frame for roadmaps saved as (time, event, impact) triples."""
+    return roadmap_frame((time, event, impact, parse_time(time, born)) for time, event, impact in data)
+
+
+def trend_frame(df, window=3):
+    """Impact, cumulative impact and rolling mean indexed by key (undated events dropped)."""
+    dated = df[df["Key"].notna()]
+    impact = dated["Impact"].astype("float64")
+    return pd.DataFrame({
+        "Impact": impact.to_numpy(),
+        "Cumulative": impact.cumsum().to_numpy(),
+        "Rolling": impact.rolling(window, min_periods=1).mean().to_numpy(),
+    }, index=pd.Index(dated["Key"].to_numpy(), name="Year"))
+
+
+def aggregate(df, period):
+    """Total, mean and count of impact per `period` years."""
+    dated = df[df["Key"].notna()]
+    bucket = (np.floor(dated["Key"].to_numpy() / period) * period).astype("int64")
+    grouped = dated["Impact"].astype("float64").groupby(bucket)
+    return pd.DataFrame({"Total": grouped.sum(), "Mean": grouped.mean(), "Events": grouped.size()}).rename_axis("Period")
+
+
+def downsample(frame, max_points=ROADMAP_MAX_POINTS):
+    """Average consecutive rows into at most max_points buckets."""
+    if len(frame) <= max_points:
+        return frame
+    bucket = np.arange(len(frame)) * max_points // len(frame)
+    index = pd.Series(frame.index.to_numpy(), dtype="float64").groupby(bucket).mean()
+    reduced = frame.reset_index(drop=True).groupby(bucket).mean()
+    reduced.index = pd.Index(index.to_numpy(), name=frame.index.name)
+    return reduced
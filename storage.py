@@ -0,0 +1,525 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from instrumentation import timed
+
+# ---------- SQLite Storage ----------
+# Accounts live in user_data.db. Connections are pooled per process and
+# shared by every session; WAL lets readers proceed while a sign-up writes.
+# Several server processes on one host can share the file: every write is
+# a BEGIN IMMEDIATE transaction (SQLite's file lock serializes writers and
+# commits are atomic), per-user versions let sessions notice changes made
+# elsewhere, and a change log tells other processes which cached entries
+# to drop. The file must be on a local disk; SQLite locking is not reliable
+# over network filesystems.
+
+DB_PATH = "user_data.db"
+POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+CHANGE_LOG_KEEP = 10000      # change_log rows kept for processes catching up
+
+
+class ConnectionPool:
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+
+def init_schema(pool):
+    with pool.transaction() as conn:
+        # email is the primary key, so login and sign-up checks are index lookups.
+        conn.execute("CREATE TABLE IF NOT EXISTS users (email TEXT PRIMARY KEY, password TEXT, full_name TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS change_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT, key TEXT)")
+
+
+def record_change(conn, topic, key):
+    """Append to the change log inside the caller's write transaction."""
+    seq = conn.execute("INSERT INTO change_log (topic, key) VALUES (?, ?)", (topic, key)).lastrowid
+    if seq % 100 == 0:
+        conn.execute("DELETE FROM change_log WHERE seq <= ?", (seq - CHANGE_LOG_KEEP,))
+
+
+class ChangeFeed:
+    """Reads changes written by any process, in order, and hands them to per-topic handlers.
+
+    One per process. poll() is a primary-key range scan, cheap enough to run
+    on every rerun.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._handlers = defaultdict(list)
+        self._lock = threading.Lock()
+        with pool.connection() as conn:
+            self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+    def subscribe(self, topic, handler):
+        """handler(keys) is called with the keys changed under topic since the last poll."""
+        self._handlers[topic].append(handler)
+
+    def poll(self):
+        with self._lock:
+            with self.pool.connection() as conn:
+                rows = conn.execute("SELECT seq, topic, key FROM change_log WHERE seq > ? ORDER BY seq", (self._seq,)).fetchall()
+            if not rows:
+                return 0
+            self._seq = rows[-1][0]
+        changed = defaultdict(set)
+        for _, topic, key in rows:
+            changed[topic].add(key)
+        for topic, keys in changed.items():
+            for handler in self._handlers[topic]:
+                handler(keys)
+        return len(rows)
+
+
+class UserStore:
+    def __init__(self, pool):
+        self.pool = pool
+
+    @timed("db")
+    def get_password_hash(self, email):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT password FROM users WHERE email = ?", (email,)).fetchone()
+        return row[0] if row else None
+
+    @timed("db")
+    def create(self, email, password_hash, full_name=None):
+        """Insert a new account. Returns False if the email is already taken."""
+        try:
+            with self.pool.transaction() as conn:
+                conn.execute("INSERT INTO users (email, password, full_name) VALUES (?, ?, ?)", (email, password_hash, full_name))
+                record_change(conn, "users", email)
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    @timed("io")
+    def migrate_json(self, path):
+        """Import accounts from the legacy users.json once; existing rows win."""
+        with self.pool.transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'users_json_migrated'").fetchone():
+                return 0
+            users = {}
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    users = json.load(f)
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO users (email, password) VALUES (?, ?)", users.items())
+            migrated = conn.total_changes - before
+            conn.execute("INSERT INTO meta (key, value) VALUES ('users_json_migrated', ?)", (str(migrated),))
+        return migrated
+
+
+# ---------- Per-user Records ----------
+# Bio fields, history entries and lifemap events are separate rows, so a
+# single edit writes a single record inside one transaction instead of
+# re-serializing the user's whole document.
+
+def init_user_data_schema(pool):
+    with pool.transaction() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS bio_fields (email TEXT, field TEXT, value TEXT, PRIMARY KEY (email, field))")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS history (id TEXT PRIMARY KEY, email TEXT NOT NULL, type TEXT, "
+            "title TEXT, timestamp TEXT, payload TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS history_email_timestamp ON history (email, timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS history_email_type_timestamp ON history (email, type, timestamp)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS lifemap_events (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT NOT NULL, "
+            "time TEXT, event TEXT, impact INTEGER, sort_key REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS lifemap_events_email ON lifemap_events (email, id)")
+        # version counts every write (sessions use it to drop caches); bio_version only bio
+        # writes, so the biodata form is not rejected after an unrelated history save.
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_versions (email TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+            "bio_version INTEGER NOT NULL DEFAULT 0)"
+        )
+
+
+class VersionConflict(Exception):
+    """The user's bio changed (in another session or process) since the caller read it."""
+
+
+def _version(conn, email):
+    row = conn.execute("SELECT version FROM user_versions WHERE email = ?", (email,)).fetchone()
+    return row[0] if row else 0
+
+
+def _bio_version(conn, email):
+    row = conn.execute("SELECT bio_version FROM user_versions WHERE email = ?", (email,)).fetchone()
+    return row[0] if row else 0
+
+
+def _bump_version(conn, email, bio=False):
+    """Advance the user's version (and bio_version for bio writes) inside a write transaction; returns the new version."""
+    conn.execute(
+        "INSERT INTO user_versions (email, version, bio_version) VALUES (?, 1, ?) "
+        "ON CONFLICT (email) DO UPDATE SET version = version + 1, bio_version = bio_version + excluded.bio_version",
+        (email, int(bio)),
+    )
+    return _version(conn, email)
+
+
+HISTORY_COLUMNS = ("id", "type", "title", "timestamp")
+
+
+def _history_row(email, entry):
+    payload = {k: v for k, v in entry.items() if k not in HISTORY_COLUMNS}
+    return (entry["id"], email, entry["type"], entry["title"], entry.get("timestamp"), json.dumps(payload))
+
+
+class UserDataStore:
+    def __init__(self, pool):
+        self.pool = pool
+
+    @timed("db")
+    def get_bio(self, email):
+        with self.pool.connection() as conn:
+            return dict(conn.execute("SELECT field, value FROM bio_fields WHERE email = ?", (email,)).fetchall())
+
+    @timed("db")
+    def version(self, email):
+        with self.pool.connection() as conn:
+            return _version(conn, email)
+
+    @timed("db")
+    def bio_version(self, email):
+        with self.pool.connection() as conn:
+            return _bio_version(conn, email)
+
+    @timed("db")
+    def set_bio_fields(self, email, fields, expected_bio_version=None):
+        """Upsert bio fields; returns the new (version, bio_version).
+
+        With expected_bio_version, raises VersionConflict (writing nothing) if
+        the bio changed since that version was read.
+        """
+        with self.pool.transaction() as conn:
+            if expected_bio_version is not None and _bio_version(conn, email) != expected_bio_version:
+                raise VersionConflict(email)
+            conn.executemany(
+                "INSERT INTO bio_fields (email, field, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (email, field) DO UPDATE SET value = excluded.value",
+                [(email, field, value) for field, value in fields.items()],
+            )
+            if "name" in fields:
+                record_change(conn, "names", email)
+            if "dob" in fields:
+                # Ages are keyed as birth year + age, so a new date of birth drops the
+                # user's keys; they are backfilled when the roadmap is next loaded.
+                conn.execute("UPDATE lifemap_events SET sort_key = NULL WHERE email = ?", (email,))
+            return _bump_version(conn, email, bio=True), _bio_version(conn, email)
+
+    @timed("db")
+    def names(self, emails=None):
+        """{email: biodata name} for the given users, or for everyone when emails is None."""
+        with self.pool.connection() as conn:
+            if emails is None:
+                return dict(conn.execute("SELECT email, value FROM bio_fields WHERE field = 'name'").fetchall())
+            emails = list(emails)
+            found = {}
+            for start in range(0, len(emails), 500):
+                batch = emails[start:start + 500]
+                found.update(conn.execute(
+                    f"SELECT email, value FROM bio_fields WHERE field = 'name' AND email IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+            return found
+
+    @timed("db")
+    def list_history(self, email):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, type, title, timestamp, payload FROM history WHERE email = ? ORDER BY timestamp, rowid", (email,)
+            ).fetchall()
+        return [dict(zip(HISTORY_COLUMNS, row[:4]), **json.loads(row[4])) for row in rows]
+
+    def _history_filter(self, email, types, since, until):
+        clauses, params = ["email = ?"], [email]
+        if types:
+            clauses.append(f"type IN ({','.join('?' * len(types))})")
+            params.extend(types)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        return " AND ".join(clauses), params
+
+    @timed("db")
+    def count_history(self, email, types=None, since=None, until=None):
+        where, params = self._history_filter(email, types, since, until)
+        with self.pool.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM history WHERE {where}", params).fetchone()[0]
+
+    @timed("db")
+    def history_index(self, email, types=None, since=None, until=None, limit=None, offset=0):
+        """Newest-first (id, type, title, timestamp) rows, without the DOT/roadmap payload."""
+        where, params = self._history_filter(email, types, since, until)
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT id, type, title, timestamp FROM history WHERE {where} "
+                "ORDER BY timestamp DESC, rowid DESC LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset],
+            ).fetchall()
+        return [dict(zip(HISTORY_COLUMNS, row)) for row in rows]
+
+    @timed("db")
+    def get_history_payload(self, email, entry_id):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT payload FROM history WHERE email = ? AND id = ?", (email, entry_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @timed("db")
+    def add_history(self, email, entry):
+        """Insert one history entry, assigning entry["id"] if missing; returns the new version."""
+        entry.setdefault("id", uuid.uuid4().hex)
+        with self.pool.transaction() as conn:
+            conn.execute("INSERT INTO history (id, email, type, title, timestamp, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                         _history_row(email, entry))
+            return _bump_version(conn, email)
+
+    @timed("db")
+    def add_history_batch(self, email, entries):
+        """Insert many history entries in one transaction (bulk import); returns the new version."""
+        for entry in entries:
+            entry.setdefault("id", uuid.uuid4().hex)
+        with self.pool.transaction() as conn:
+            conn.executemany("INSERT INTO history (id, email, type, title, timestamp, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                             [_history_row(email, entry) for entry in entries])
+            return _bump_version(conn, email)
+
+    @timed("db")
+    def delete_history(self, email, entry_id):
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM history WHERE email = ? AND id = ?", (email, entry_id))
+            return _bump_version(conn, email)
+
+    @timed("db")
+    def list_lifemap(self, email):
+        """(id, time, event, impact, sort_key) rows in entry order."""
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT id, time, event, impact, sort_key FROM lifemap_events WHERE email = ? ORDER BY id", (email,)
+            ).fetchall()
+
+    @timed("db")
+    def add_lifemap_event(self, email, time, event, impact, sort_key):
+        with self.pool.transaction() as conn:
+            conn.execute("INSERT INTO lifemap_events (email, time, event, impact, sort_key) VALUES (?, ?, ?, ?, ?)",
+                         (email, time, event, impact, sort_key))
+            return _bump_version(conn, email)
+
+    @timed("db")
+    def set_lifemap_keys(self, email, keys):
+        """Backfill sort keys for events stored before keys were parsed at insert time."""
+        with self.pool.transaction() as conn:
+            conn.executemany("UPDATE lifemap_events SET sort_key = ? WHERE email = ? AND id = ?",
+                             [(key, email, event_id) for event_id, key in keys.items()])
+
+    @timed("io")
+    def migrate_json(self, email, path):
+        """Import a legacy user_data/<email>.json document once per user."""
+        marker = f"user_json_migrated:{email}"
+        with self.pool.transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                return False
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    data = json.load(f)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO bio_fields (email, field, value) VALUES (?, ?, ?)",
+                    [(email, field, value) for field, value in data.get("bio", {}).items()],
+                )
+                if "name" in data.get("bio", {}):
+                    record_change(conn, "names", email)
+                for entry in data.get("history", []):
+                    entry.setdefault("id", uuid.uuid4().hex)
+                    conn.execute("INSERT OR IGNORE INTO history (id, email, type, title, timestamp, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                                 _history_row(email, entry))
+                # sort_key is left NULL and backfilled the first time the roadmap is loaded.
+                conn.executemany(
+                    "INSERT INTO lifemap_events (email, time, event, impact) VALUES (?, ?, ?, ?)",
+                    [(email, *event) for event in data.get("lifemap", [])],
+                )
+                _bump_version(conn, email, bio=bool(data.get("bio")))
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, path))
+        return True
+
+
+class UserData:
+    """A session's lazy view of one user's records; each section loads on first access.
+
+    refresh() drops everything cached once the user's version shows a write
+    from another session or process.
+    """
+
+    def __init__(self, store, email):
+        self.store = store
+        self.email = email
+        self._version = store.version(email)
+        self._reset()
+
+    def _reset(self):
+        self._bio = None
+        self._bio_version = None
+        self._payloads = {}  # history id -> payload, filled as entries are opened
+        self._frames = {}    # history id -> roadmap frame for opened Life Roadmaps
+        self._roadmap = None
+
+    @property
+    def version(self):
+        return self._version
+
+    def refresh(self):
+        """Call once per rerun; returns True if cached records were dropped."""
+        version = self.store.version(self.email)
+        if version == self._version:
+            return False
+        self._version = version
+        self._reset()
+        return True
+
+    def _wrote(self, version):
+        # Our own write keeps the caches valid, unless another writer got in between.
+        if version == self._version + 1:
+            self._version = version
+
+    @property
+    def bio(self):
+        if self._bio is None:
+            # Version first: a write in between can only make it look stale, never fresh.
+            self._bio_version = self.store.bio_version(self.email)
+            self._bio = self.store.get_bio(self.email)
+        return self._bio
+
+    @property
+    def bio_version(self):
+        """The bio version the cached bio was read at."""
+        self.bio
+        return self._bio_version
+
+    def save_bio(self, fields, expected_bio_version=None):
+        """Save changed fields. With expected_bio_version (the version the form was
+        filled from), raises VersionConflict and reloads if the bio changed since."""
+        changed = {k: v for k, v in fields.items() if self.bio.get(k) != v}
+        if changed:
+            try:
+                version, bio_version = self.store.set_bio_fields(self.email, changed, expected_bio_version)
+            except VersionConflict:
+                self.refresh()
+                raise
+            self._bio.update(changed)
+            self._bio_version = bio_version
+            if "dob" in changed:
+                self._roadmap = None
+                self._frames = {}
+            self._wrote(version)
+
+    def history_page(self, page, page_size, types=None, since=None, until=None):
+        """Return (entries, total) for one page of the index; payloads are not loaded."""
+        total = self.store.count_history(self.email, types, since, until)
+        entries = self.store.history_index(self.email, types, since, until, limit=page_size, offset=page * page_size)
+        return entries, total
+
+    def history_payload(self, entry_id):
+        if entry_id not in self._payloads:
+            self._payloads[entry_id] = self.store.get_history_payload(self.email, entry_id)
+        return self._payloads[entry_id]
+
+    @timed("compute", "history roadmap frame")
+    def history_roadmap(self, entry_id):
+        """Typed frame for a saved Life Roadmap, built once per session; None if it has no data."""
+        if entry_id not in self._frames:
+            from roadmap import frame_from_columns, legacy_frame
+
+            payload = self.history_payload(entry_id) or {}
+            if "columns" in payload:
+                self._frames[entry_id] = frame_from_columns(payload["columns"])
+            elif "data" in payload:
+                self._frames[entry_id] = legacy_frame(payload["data"], self.born)
+            else:
+                self._frames[entry_id] = None
+        return self._frames[entry_id]
+
+    def add_history(self, entry):
+        self._wrote(self.store.add_history(self.email, entry))
+        return entry["id"]
+
+    def add_history_batch(self, entries):
+        self._wrote(self.store.add_history_batch(self.email, entries))
+        return [entry["id"] for entry in entries]
+
+    def delete_history(self, entry_id):
+        self._wrote(self.store.delete_history(self.email, entry_id))
+        self._payloads.pop(entry_id, None)
+        self._frames.pop(entry_id, None)
+
+    @property
+    @timed("compute", "roadmap frame")
+    def roadmap(self):
+        """The Life Roadmap as a typed frame ordered by parsed time; built once per session."""
+        if self._roadmap is None:
+            from roadmap import parse_time, roadmap_frame
+
+            rows = self.store.list_lifemap(self.email)
+            missing = {row[0]: parse_time(row[1], self.born) for row in rows if row[4] is None}
+            missing = {event_id: key for event_id, key in missing.items() if key is not None}
+            if missing:
+                self.store.set_lifemap_keys(self.email, missing)
+            self._roadmap = roadmap_frame((time, event, impact, missing.get(event_id, key))
+                                          for event_id, time, event, impact, key in rows)
+        return self._roadmap
+
+    @property
+    def born(self):
+        from roadmap import birth_year
+
+        return birth_year(self.bio)
+
+    def add_lifemap_event(self, time, event, impact):
+        from roadmap import parse_time, roadmap_frame
+
+        key = parse_time(time, self.born)
+        self._wrote(self.store.add_lifemap_event(self.email, time, event, impact, key))
+        if self._roadmap is not None:
+            rows = zip(self._roadmap["Time"], self._roadmap["Event"], self._roadmap["Impact"], self._roadmap["Key"])
+            self._roadmap = roadmap_frame(list(rows) + [(time, event, impact, key)])
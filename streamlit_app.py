@@ -1,511 +1,860 @@
-import streamlit as st
-from datetime import datetime, date
-import uuid
-import os
-import json
-import pandas as pd
-import graphviz
-from supabase import create_client, Client
-import base64
-import random
-
-# ---------- Configurations ----------
-st.set_page_config(page_title="Jalinan Insan", page_icon="👥", layout="wide")
-USER_FILE = "users.json"
-DATA_DIR = "user_data"
-LOGO_PATH = "logoJK.png"
-
-# --- Supabase Setup ---
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-if not os.path.exists(DATA_DIR):
-    os.makedirs(DATA_DIR)
-
-# ---------- Load logo image ----------
-def get_image_base64(path):
-    try:
-        with open(path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    except Exception:
-        return ""
-
-def render_logo(center=True, size="large"):
-    image_base64 = get_image_base64(LOGO_PATH)
-    width = 200 if size == "large" else 100
-    alignment = "center" if center else "left"
-    if image_base64:
-        st.markdown(f"<div style='text-align:{alignment};'><img src='data:image/png;base64,{image_base64}' width='{width}'></div>", unsafe_allow_html=True)
-
-# ---------- Helper Functions ----------
-def hash_password(password):
-    import hashlib
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def load_users():
-    if os.path.exists(USER_FILE):
-        with open(USER_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_users(users):
-    with open(USER_FILE, "w") as f:
-        json.dump(users, f)
-
-def get_user_data_path(email):
-    return os.path.join(DATA_DIR, f"{email}.json")
-
-def load_user_data(email):
-    path = get_user_data_path(email)
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return json.load(f)
-    return {"bio": {}, "history": [], "lifemap": []}
-
-def save_user_data(email, data):
-    with open(get_user_data_path(email), "w") as f:
-        json.dump(data, f, indent=2)
-
-# ---------- Session State ----------
-if "authenticated" not in st.session_state:
-    st.session_state.authenticated = False
-if "user_email" not in st.session_state:
-    st.session_state.user_email = None
-if "user_data" not in st.session_state:
-    st.session_state.user_data = {}
-if "selected_tool" not in st.session_state:
-    st.session_state.selected_tool = None
-if "generated_center" not in st.session_state:
-    st.session_state.generated_center = None
-if "ecomap_graph" not in st.session_state:
-    st.session_state.ecomap_graph = graphviz.Digraph()
-if "social_graph" not in st.session_state:
-    st.session_state.social_graph = graphviz.Digraph()
-if "current_genogram" not in st.session_state:
-    st.session_state.current_genogram = None
-
-# ---------- Sidebar Login/Signup ----------
-with st.sidebar:
-    render_logo(size="small")
-    st.title("🔐 Login / Sign Up")
-    mode = st.radio("Choose Option:", ["Login", "Sign Up"])
-
-    users_db = load_users()
-    if mode == "Sign Up":
-        new_email = st.text_input("Email", key="signup_email")
-        new_pass = st.text_input("Password", type="password", key="signup_pass")
-        if st.button("Sign Up"):
-            if new_email in users_db:
-                st.warning("User already exists.")
-            else:
-                users_db[new_email] = hash_password(new_pass)
-                save_users(users_db)
-                st.success("Account created. Please log in.")
-    else:
-        email = st.text_input("Email", key="login_email")
-        password = st.text_input("Password", type="password", key="login_password")
-        if st.button("Log In"):
-            if email in users_db and users_db[email] == hash_password(password):
-                st.session_state.authenticated = True
-                st.session_state.user_email = email
-                st.session_state.user_data = load_user_data(email)
-                # Simulate Supabase session: must be set for messaging
-                # Here, we fake a session user dict, but in reality, you'd set this after supabase login
-                if "user" not in st.session_state:
-                    # Use email as id fallback if not using Supabase auth
-                    st.session_state.user = {"id": email, "email": email}
-                st.success(f"Welcome, {email}")
-            else:
-                st.error("Invalid credentials.")
-
-# ---------- Main App ----------
-if st.session_state.authenticated and "user" in st.session_state:
-    tabs = st.tabs(["🏠 Home", "💬 Messaging", "📚 History", "👤 Biodata", "🧰 Tools"])
-
-    # ---------- Home Tab ----------
-    with tabs[0]:
-        render_logo()
-        st.success("🌟 Welcome to Jalinan Insan")
-        bio = st.session_state.user_data.get("bio", {})
-        st.markdown(f"**Name:** {bio.get('name', 'Not set')}")
-        st.markdown(f"**Email:** {st.session_state.user_email}")
-        st.markdown(f"**Place of Birth:** {bio.get('birth_place', 'Not set')}")
-        st.success("🌟 Quote of the Day")
-        st.info(random.choice([
-            "Helping one person might not change the world, but it could change the world for one person.",
-            "Orang yang gagal akan nampak alasan pada setiap peluang, manakala orang yang berjaya akan nampak peluang dalam setiap alasan.",
-            "Act as if what you do makes a difference. It does.",
-            "You play stupid game, you win stupid prizes.",
-            "The best revenge is to forgive.",
-            "Envy eats away faith just as fire consumes wood.",
-            "Pride prevents a man from seeking knowledge.",
-            "The worst friend is he who is only with you when you are wealthy and leaves you when you are poor.",
-            "kalau tidak dipecahkan ruyung, manakan dapat sagunya.",
-            "Susah dahulu, Senang kemudian.",
-            "Berani kerana benar, takut kerana salah.",
-            "Any problems can occur at any moments, thus confirmation is important.",
-            "The past is in the past."
-        ]))
-        st.markdown("### 📰 Latest News")
-
-    # ---------- Messaging Tab ----------
-    with tabs[1]:
-        st.header("💬 Messaging")
-        current_user_id = st.session_state["user"]["id"]
-
-        # --- Search for contact ---
-        st.subheader("Search Contact")
-        search_id = st.text_input("Enter user ID to search")
-        if search_id:
-            result = supabase.table("contacts").select("*").or_(
-                f"(requester_id.eq.{current_user_id},requestee_id.eq.{search_id})"
-            ).execute()
-            if not result.data:
-                st.info("No contact found. You may need to send/accept a request first.")
-            else:
-                st.success("A contact exists with this user.")
-
-        # --- Get user's accepted contacts ---
-        contacts_data = supabase.table("contacts").select("*").or_(
-            f"(requester_id.eq.{current_user_id},requestee_id.eq.{current_user_id})"
-        ).eq("status", "accepted").execute().data
-
-        contact_ids = [
-            c["requester_id"] if c["requester_id"] != current_user_id else c["requestee_id"]
-            for c in contacts_data
-        ]
-
-        st.subheader("Your Contacts")
-        if not contact_ids:
-            st.info("No accepted contacts yet.")
-        else:
-            # Get contact labels (email if available, else id)
-            contact_options = []
-            user_table = supabase.table("users")
-            for uid in contact_ids:
-                res = user_table.select("email").eq("id", uid).execute()
-                if res.data:
-                    contact_options.append({"id": uid, "label": res.data[0]["email"]})
-                else:
-                    contact_options.append({"id": uid, "label": str(uid)})
-
-            contact_labels = [c["label"] for c in contact_options]
-            if contact_labels:
-                selected_idx = st.selectbox("Choose a contact", range(len(contact_labels)), format_func=lambda i: contact_labels[i])
-                selected_contact = contact_options[selected_idx]["id"]
-
-                # --- Load messages ---
-                def load_messages():
-                    msgs = supabase.table("messages").select("*").or_(
-                        f"(sender_id.eq.{current_user_id},receiver_id.eq.{selected_contact}),"
-                        f"(sender_id.eq.{selected_contact},receiver_id.eq.{current_user_id})"
-                    ).order("created_at", desc=False).execute().data
-                    return msgs
-
-                msgs = load_messages()
-                st.markdown("### Chat")
-                for m in msgs:
-                    sender = "You" if m["sender_id"] == current_user_id else next((c["label"] for c in contact_options if c["id"] == m["sender_id"]), str(m["sender_id"]))
-                    if m["text"]:
-                        st.markdown(f"**{sender}:** {m['text']}  \n<sub>{m['created_at']}</sub>", unsafe_allow_html=True)
-                    if m.get("media_url"):
-                        if m.get("media_type") == "image/png":
-                            st.image(m["media_url"], width=200)
-                        elif m.get("media_type") == "application/pdf":
-                            st.markdown(f"[📄 PDF File]({m['media_url']})")
-                # --- Send new message ---
-                st.subheader("Send a Message")
-                new_text = st.text_input("Type your message", key="msg_text")
-                uploaded_file = st.file_uploader("Send a file (PNG or PDF)", type=["png", "pdf"], key="msg_file")
-                if st.button("Send", key="send_btn"):
-                    media_url = None
-                    media_type = None
-                    if uploaded_file is not None:
-                        filename = f"{uuid.uuid4()}_{uploaded_file.name}"
-                        res = supabase.storage.from_("chat_files").upload(filename, uploaded_file)
-                        if res.status_code == 200:
-                            media_url = f"{SUPABASE_URL}/storage/v1/object/public/chat_files/{filename}"
-                            media_type = uploaded_file.type
-                        else:
-                            st.error("Failed to upload file.")
-                    supabase.table("messages").insert({
-                        "sender_id": current_user_id,
-                        "receiver_id": selected_contact,
-                        "text": new_text if new_text else None,
-                        "media_url": media_url,
-                        "media_type": media_type
-                    }).execute()
-                    st.experimental_rerun()
-                st.caption("Refresh the page to see new messages. (Polling every page load)")
-
-    # ---------- History Tab ----------
-    with tabs[2]:
-        st.header("📚 History")
-        history_data = st.session_state.user_data.get("history", [])
-        if not history_data:
-            st.info("No saved maps yet. Create some using the Tools tab!")
-        else:
-            for i, item in enumerate(history_data):
-                st.divider()
-                st.subheader(f"{item['type']}: {item['title']}")
-                st.caption(f"Created: {item.get('timestamp', 'Unknown')}")
-                if item["type"] in ["Genogram", "Ecomap", "Social Network"]:
-                    try:
-                        st.graphviz_chart(item["dot"])
-                    except Exception as e:
-                        st.error(f"Could not render diagram: {str(e)}")
-                elif item["type"] == "Life Roadmap":
-                    if "data" in item:
-                        df = pd.DataFrame(item["data"], columns=["Time", "Event", "Impact"])
-                        st.line_chart(df.set_index("Time")["Impact"])
-                        st.dataframe(df)
-                    else:
-                        st.warning("No data available for this roadmap")
-                if st.button(f"❌ Delete this {item['type']}", key=f"delete_{i}"):
-                    del st.session_state.user_data["history"][i]
-                    save_user_data(st.session_state.user_email, st.session_state.user_data)
-                    st.experimental_rerun()
-
-    # ---------- Biodata Tab ----------
-    with tabs[3]:
-        st.header("👤 Biodata")
-        bio = st.session_state.user_data.get("bio", {})
-        with st.form("bio_form"):
-            name = st.text_input("Full Name", value=bio.get("name", ""))
-            dob = st.date_input("Date of Birth", value=date(2000, 1, 1))
-            email = st.text_input("Email", value=st.session_state.user_email)
-            marital = st.selectbox("Marital Status", ["Single", "Married", "Divorced", "Widowed"])
-            birth = st.text_input("Place of Birth", value=bio.get("birth_place", ""))
-            about = st.text_area("About You", value=bio.get("about", ""))
-            work = st.text_input("Work/School", value=bio.get("work", ""))
-            if st.form_submit_button("Save"):
-                st.session_state.user_data["bio"] = {
-                    "name": name, "dob": str(dob), "email": email,
-                    "marital_status": marital, "birth_place": birth,
-                    "about": about, "work": work
-                }
-                save_user_data(st.session_state.user_email, st.session_state.user_data)
-                st.success("Saved.")
-
-    # ---------- Tools Tab ----------
-    with tabs[4]:
-        st.header("🧰 Tools")
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            if st.button("👨‍👩‍👧‍👦 Genogram"):
-                st.session_state.selected_tool = "Genogram"
-        with col2:
-            if st.button("🌐 Ecomap"):
-                st.session_state.selected_tool = "Ecomap"
-        with col3:
-            if st.button("🤝 Social Network"):
-                st.session_state.selected_tool = "Social"
-        with col4:
-            if st.button("🛣️ Life Roadmap"):
-                st.session_state.selected_tool = "Life"
-        tool = st.session_state.selected_tool
-
-        # ---------- Genogram ----------
-        if tool == "Genogram":
-            st.success("🌟 Welcome to Genogram")
-            st.header("👨‍👩‍👧‍👦 Genogram")
-            with st.form("genogram_form"):
-                st.subheader("Father Side")
-                father = st.text_input("Father")
-                paternal_grandfather = st.text_input("Paternal Grandfather")
-                paternal_grandmother = st.text_input("Paternal Grandmother")
-                paternal_aunts = st.text_area("Paternal Aunts (comma-separated)")
-                paternal_uncles = st.text_area("Paternal Uncles (comma-separated)")
-
-                st.subheader("Mother Side")
-                mother = st.text_input("Mother")
-                maternal_grandfather = st.text_input("Maternal Grandfather")
-                maternal_grandmother = st.text_input("Maternal Grandmother")
-                maternal_aunts = st.text_area("Maternal Aunts (comma-separated)")
-                maternal_uncles = st.text_area("Maternal Uncles (comma-separated)")
-
-                st.subheader("You")
-                user_name = st.text_input("Your Name")
-                user_spouse = st.text_input("Spouse")
-                user_siblings = st.text_area("Siblings (comma-separated)")
-                user_children = st.text_area("Children (comma-separated)")
-                submitted = st.form_submit_button("Generate Genogram")
-
-            if submitted:
-                dot = graphviz.Digraph()
-                def node(name, gender):
-                    if gender == "M":
-                        dot.node(name, name, shape="box", style="filled", fillcolor="lightblue")
-                    else:
-                        dot.node(name, name, shape="ellipse", style="filled", fillcolor="pink")
-                node(paternal_grandfather, "M")
-                node(paternal_grandmother, "F")
-                dot.edge(paternal_grandfather, father)
-                dot.edge(paternal_grandmother, father)
-                node(maternal_grandfather, "M")
-                node(maternal_grandmother, "F")
-                dot.edge(maternal_grandfather, mother)
-                dot.edge(maternal_grandmother, mother)
-                node(father, "M")
-                node(mother, "F")
-                dot.edge(father, user_name)
-                dot.edge(mother, user_name)
-                for s in [s.strip() for s in user_siblings.split(",") if s.strip()]:
-                    node(s, "M")
-                    dot.edge(father, s)
-                    dot.edge(mother, s)
-                if user_spouse.strip():
-                    node(user_spouse, "F")
-                    dot.edge(user_name, user_spouse, label="marriage")
-                for c in [c.strip() for c in user_children.split(",") if c.strip()]:
-                    node(c, "F" if random.random() > 0.5 else "M")
-                    if user_spouse.strip():
-                        dot.edge(user_name, c)
-                        dot.edge(user_spouse, c)
-                    else:
-                        dot.edge(user_name, c)
-                st.graphviz_chart(dot)
-                st.session_state.current_genogram = {
-                    "dot": dot.source,
-                    "title": f"Genogram: {user_name}'s Family"
-                }
-
-            if 'current_genogram' in st.session_state:
-                if st.button("💾 Save to History", key="save_genogram"):
-                    history_entry = {
-                        "type": "Genogram",
-                        "title": st.session_state.current_genogram["title"],
-                        "dot": st.session_state.current_genogram["dot"],
-                        "timestamp": str(datetime.now())
-                    }
-                    if "history" not in st.session_state.user_data:
-                        st.session_state.user_data["history"] = []
-                    st.session_state.user_data["history"].append(history_entry)
-                    save_user_data(st.session_state.user_email, st.session_state.user_data)
-                    st.success(f"Saved {history_entry['title']} to history!")
-                    del st.session_state.current_genogram
-
-        # ---------- Ecomap ----------
-        elif tool == "Ecomap":
-            st.success("🌟 Welcome to Ecomap")
-            st.subheader("🌐 Ecomap Tool")
-            center = st.session_state.generated_center or st.text_input("Family Member (center)", value="You")
-            col1, col2 = st.columns(2)
-            with col1:
-                name = st.text_input("Relation factor")
-                entity_type = st.selectbox("Relation Type", ["Person", "Work/School", "Pet", "Agency"])
-                relation = st.radio("Relation Outcome", ["Positive", "Negative", "Complicated"], horizontal=True)
-                direction = st.radio("Relation Direction", ["From user →", "To user ←"], horizontal=True)
-                if st.button("➕ Add Connection"):
-                    shape = "circle" if entity_type == "Person" else "box"
-                    color = {"Positive": "green", "Negative": "red", "Complicated": "orange"}[relation]
-                    style = {"Positive": "solid", "Negative": "dashed", "Complicated": "bold"}[relation]
-                    label = {"Positive": "─────", "Negative": "⸺⸺⸺", "Complicated": "/\/\/\/"}[relation]
-                    st.session_state.ecomap_graph.node(center, center, shape="circle", color="blue")
-                    st.session_state.ecomap_graph.node(name, name, shape=shape, color=color)
-                    if direction == "From user →":
-                        st.session_state.ecomap_graph.edge(center, name, color=color, label=label, style=style)
-                    else:
-                        st.session_state.ecomap_graph.edge(name, center, color=color, label=label, style=style)
-            with col2:
-                st.graphviz_chart(st.session_state.ecomap_graph)
-                if st.button("💾 Save to History", key="save_ecomap"):
-                    title = f"Ecomap: {center}'s Connections"
-                    history_entry = {
-                        "type": "Ecomap",
-                        "title": title,
-                        "dot": st.session_state.ecomap_graph.source,
-                        "timestamp": str(datetime.now())
-                    }
-                    if "history" not in st.session_state.user_data:
-                        st.session_state.user_data["history"] = []
-                    st.session_state.user_data["history"].append(history_entry)
-                    save_user_data(st.session_state.user_email, st.session_state.user_data)
-                    st.success(f"Saved {title} to history!")
-                if st.button("🔄 Reset Ecomap", key="reset_ecomap"):
-                    st.session_state.ecomap_graph = graphviz.Digraph()
-
-        # ---------- Social Network ----------
-        elif tool == "Social":
-            st.success("🌟 Welcome to Social Network Diagram")
-            st.header("🫂 Social Network")
-            center = st.text_input("Your Name (center)", value="You")
-            col1, col2 = st.columns(2)
-            with col1:
-                name = st.text_input("Connection Name")
-                entity_type = st.selectbox("Entity Type", ["Person", "Work/School", "Pet", "Agency"])
-                relation = st.radio("Relationship Type", ["Positive", "Negative", "Complicated"], horizontal=True)
-                direction = st.radio("Support Direction", ["From user →", "To user ←"], horizontal=True)
-                if st.button("➕ Add Connection"):
-                    shape = "circle" if entity_type == "Person" else "box"
-                    color_map = {"Positive": "green", "Negative": "red", "Complicated": "orange"}
-                    style_map = {"Positive": "solid", "Negative": "dashed", "Complicated": "bold"}
-                    label_map = {"Positive": "─────", "Negative": "⸺⸺⸺", "Complicated": "/\/\/\/"}
-                    st.session_state.social_graph.node(center, center, shape="circle", color="blue")
-                    st.session_state.social_graph.node(name, name, shape=shape, color=color_map[relation])
-                    if direction == "From user →":
-                        st.session_state.social_graph.edge(center, name, 
-                                                          color=color_map[relation], 
-                                                          label=label_map[relation], 
-                                                          style=style_map[relation])
-                    else:
-                        st.session_state.social_graph.edge(name, center, 
-                                                          color=color_map[relation], 
-                                                          label=label_map[relation], 
-                                                          style=style_map[relation])
-            with col2:
-                st.graphviz_chart(st.session_state.social_graph)
-                if st.button("💾 Save to History", key="save_social"):
-                    title = f"Social Network: {center}"
-                    history_entry = {
-                        "type": "Social Network",
-                        "title": title,
-                        "dot": st.session_state.social_graph.source,
-                        "timestamp": str(datetime.now())
-                    }
-                    if "history" not in st.session_state.user_data:
-                        st.session_state.user_data["history"] = []
-                    st.session_state.user_data["history"].append(history_entry)
-                    save_user_data(st.session_state.user_email, st.session_state.user_data)
-                    st.success(f"Saved {title} to history!")
-                if st.button("🔄 Reset Social Network", key="reset_social"):
-                    st.session_state.social_graph = graphviz.Digraph()
-
-        # ---------- Life Roadmap ----------
-        elif tool == "Life":
-            st.success("🌟 Welcome to Life Roadmap")
-            st.subheader("🛣️ Life Roadmap")
-            with st.form("life_form", clear_on_submit=True):
-                time = st.text_input("Time (Year/Age)", placeholder="e.g., 2023 or Age 25")
-                event = st.text_input("Event", placeholder="e.g., Graduated from University")
-                impact = st.slider("Impact", -10, 10, 0)
-                submitted_life = st.form_submit_button("➕ Add Event")
-                if submitted_life and time and event:
-                    if "lifemap" not in st.session_state.user_data:
-                        st.session_state.user_data["lifemap"] = []
-                    st.session_state.user_data["lifemap"].append((time, event, impact))
-                    save_user_data(st.session_state.user_email, st.session_state.user_data)
-            if st.session_state.user_data.get("lifemap"):
-                st.subheader("Your Life Roadmap")
-                df = pd.DataFrame(st.session_state.user_data["lifemap"], columns=["Time", "Event", "Impact"])
-                st.line_chart(df.set_index("Time")["Impact"])
-                st.dataframe(df)
-                if st.button("💾 Save to History", key="save_life"):
-                    title = f"Life Roadmap: {st.session_state.user_data['bio'].get('name', 'My Life')}"
-                    history_entry = {
-                        "type": "Life Roadmap",
-                        "title": title,
-                        "data": st.session_state.user_data["lifemap"],
-                        "timestamp": str(datetime.now())
-                    }
-                    if "history" not in st.session_state.user_data:
-                        st.session_state.user_data["history"] = []
-                    st.session_state.user_data["history"].append(history_entry)
-                    save_user_data(st.session_state.user_email, st.session_state.user_data)
-                    st.success(f"Saved {title} to history!")
-
-else:
-    render_logo()
-    st.title("👥 Jalinan Insan")
-    st.info("Please log in or sign up to access the app features. Use the sidebar to log in or create a new account.")
+import streamlit as st
+from datetime import datetime, date, timedelta
+import os
+import html
+import json
+import functools
+from collections import deque
+import random
+from contacts import ContactDirectory, ContactSearchIndex
+from data_access import DATA_TIMEOUT, SupabaseRepository, is_missing_function, memory_repository
+from messages import get_conversation_window
+from genogram import GENDER_LABELS, RELATIONS, genogram_from_form
+from interchange import csv_entries, gedcom_entries, genogram_to_gedcom, graph_to_csv, import_entries, text_lines
+from diagrams import NetworkGraph, RenderCache, connection_attrs, history_dot
+from storage import ChangeFeed, ConnectionPool, UserData, UserDataStore, UserStore, VersionConflict, init_schema, init_user_data_schema
+from attachments import CHAT_BUCKET, AttachmentPipeline, LocalStorage, ThumbnailCache, content_type_is_image
+from live import LIVE_POLL_SECONDS, LIVE_REFRESH_SECONDS, LIVE_SYNC_EVERY, LiveInbox, LocalEventSource, SupabaseRealtimeSource
+from instrumentation import ProcessMetrics, configure_perf_log, profiled_run, span
+
+# ---------- Configurations ----------
+st.set_page_config(page_title="Jalinan Insan", page_icon="👥", layout="wide")
+USER_FILE = "users.json"
+DATA_DIR = "user_data"
+DB_PATH = "user_data.db"
+LOCAL_STORAGE_DIR = "local_storage"
+LOGO_PATH = "static/logoJK.png"
+LOGO_URL = "app/static/logoJK.png"
+HISTORY_TYPES = ["Genogram", "Ecomap", "Social Network", "Life Roadmap"]
+HISTORY_PAGE_SIZE = 10
+INBOX_PREVIEW_ROWS = 20
+
+# --- Supabase Setup ---
+# A "memory://<name>" URL runs against in-process tables instead (local runs, benchmarks).
+SUPABASE_URL = st.secrets["SUPABASE_URL"]
+SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
+IN_MEMORY = SUPABASE_URL.startswith("memory://")
+
+# --- Instrumentation ---
+# Admins get a debug panel that profiles their own reruns. PERF_LOG ("stderr" or a
+# file path) profiles every session's reruns and logs each as one JSON line.
+# ADMIN_EMAILS is a list (ADMIN_EMAILS = ["a@x.com", "b@x.com"]) or one comma-separated string.
+def admin_emails(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return [email.strip() for email in value if email.strip()]
+
+ADMIN_EMAILS = admin_emails(st.secrets.get("ADMIN_EMAILS", []))
+PERF_LOG = st.secrets.get("PERF_LOG", "")
+PERF_RECENT_RUNS = 10
+
+# ---------- Logo ----------
+@st.cache_resource
+def logo_available():
+    return os.path.exists(LOGO_PATH)
+
+def render_logo(center=True, size="large"):
+    # Served from the static folder (see .streamlit/config.toml) so the browser
+    # caches it, instead of re-reading and inlining it as base64 on every call.
+    width = 200 if size == "large" else 100
+    alignment = "center" if center else "left"
+    if logo_available():
+        st.markdown(f"<div style='text-align:{alignment};'><img src='{LOGO_URL}' width='{width}'></div>", unsafe_allow_html=True)
+
+# ---------- Process-wide Caches ----------
+@st.cache_resource
+def get_db_pool():
+    pool = ConnectionPool(DB_PATH)
+    init_schema(pool)
+    init_user_data_schema(pool)
+    return pool
+
+@st.cache_resource
+def get_user_store():
+    store = UserStore(get_db_pool())
+    store.migrate_json(USER_FILE)
+    return store
+
+@st.cache_resource
+def get_change_feed():
+    # Cache invalidations written by any server process sharing the database.
+    return ChangeFeed(get_db_pool())
+
+@st.cache_resource
+def get_user_data_store():
+    return UserDataStore(get_db_pool())
+
+@st.cache_resource
+def get_repository():
+    if IN_MEMORY:
+        return memory_repository(SUPABASE_URL, storage=LocalStorage(LOCAL_STORAGE_DIR))
+    from supabase import ClientOptions, create_client
+
+    # One client (and HTTP connection pool) for every session in the process.
+    client = create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(postgrest_client_timeout=DATA_TIMEOUT))
+    return SupabaseRepository(client)
+
+@st.cache_resource
+def get_contact_directory():
+    directory = ContactDirectory(get_repository())
+    # A sign-up (in any process) replaces a cached "unknown user" label; the feed's keys are
+    # emails, which match contact ids where the email doubles as the id.
+    get_change_feed().subscribe("users", directory.invalidate)
+    return directory
+
+@st.cache_resource
+def get_search_index():
+    # Loaded on the first search in the process and reloaded every SEARCH_RESYNC seconds;
+    # name edits from the change feed are applied in between.
+    index = ContactSearchIndex(get_repository(), get_user_data_store().names)
+    get_change_feed().subscribe("users", index.users_changed)
+    get_change_feed().subscribe("names", index.names_changed)
+    return index
+
+@st.cache_resource
+def get_render_cache():
+    return RenderCache()
+
+@st.cache_resource
+def get_attachment_pipeline():
+    return AttachmentPipeline(get_repository().storage, f"{SUPABASE_URL}/storage/v1/object/public/{CHAT_BUCKET}")
+
+@st.cache_resource
+def get_thumbnail_cache():
+    return ThumbnailCache(get_repository().storage, f"{SUPABASE_URL}/storage/v1/object/public/{CHAT_BUCKET}")
+
+@st.cache_resource
+def get_live_source():
+    if IN_MEMORY:
+        return LocalEventSource()
+    try:
+        from supabase import acreate_client  # noqa: F401 - realtime needs the async client
+    except ImportError:
+        return LocalEventSource()
+    return SupabaseRealtimeSource(SUPABASE_URL, SUPABASE_KEY)
+
+@st.cache_resource
+def get_perf_metrics():
+    if PERF_LOG:
+        configure_perf_log(PERF_LOG)
+    return ProcessMetrics()
+
+# ---------- Instrumentation ----------
+def keep_profile(profile):
+    st.session_state.setdefault("perf_profiles", deque(maxlen=PERF_RECENT_RUNS)).append(profile)
+
+def perf_run(name):
+    """Profile a rerun (or fragment rerun) when enabled; inside a profiled run, time it as a section."""
+    enabled = bool(PERF_LOG) or st.session_state.get("debug_panel", False)
+    return profiled_run(name, enabled, session=st.session_state.get("user_email"), metrics=get_perf_metrics(),
+                        log=bool(PERF_LOG), on_finish=keep_profile)
+
+def profiled(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with perf_run(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# ---------- Helper Functions ----------
+def hash_password(password):
+    import hashlib
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def get_user_data_path(email):
+    return os.path.join(DATA_DIR, f"{email}.json")
+
+def load_user_data(email):
+    # Legacy per-user JSON documents are imported into SQLite on first login.
+    store = get_user_data_store()
+    store.migrate_json(email, get_user_data_path(email))
+    return UserData(store, email)
+
+def save_to_history(entry):
+    st.session_state.user_data.add_history(entry)
+    if entry["type"] in ["Genogram", "Ecomap", "Social Network"]:
+        # Lay the diagram out now so the History tab finds it cached.
+        get_render_cache().prerender(history_dot(entry))
+
+def stored_date(value, default):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default
+
+def remove_connection(graph_key, center, select_key):
+    st.session_state[graph_key].remove_connection(center, st.session_state[select_key])
+
+def render_diagram(dot):
+    import graphviz
+
+    try:
+        with span("compute", "graphviz layout"):
+            svg = get_render_cache().render(dot)
+    except graphviz.ExecutableNotFound:
+        svg = None
+    if svg is None:
+        # No Graphviz binary on this host, or the layout is still running on the
+        # shared workers: let the browser lay it out instead.
+        st.graphviz_chart(dot)
+    else:
+        st.markdown(f"<div style='overflow-x:auto;'>{svg}</div>", unsafe_allow_html=True)
+
+def render_roadmap(roadmap, key):
+    from roadmap import PERIODS, aggregate, downsample, trend_frame
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        period = st.selectbox("Group by", list(PERIODS), key=f"{key}_period")
+    with col2:
+        view = st.selectbox("Show", ["Impact", "Cumulative", "Rolling"], key=f"{key}_view", disabled=PERIODS[period] is not None)
+    with col3:
+        window = st.number_input("Rolling window", min_value=1, max_value=50, value=3, key=f"{key}_window")
+    with span("compute", "roadmap chart"):
+        if PERIODS[period]:
+            chart = aggregate(roadmap, PERIODS[period])["Total"]
+        else:
+            chart = downsample(trend_frame(roadmap, window))[view]
+    if PERIODS[period]:
+        st.bar_chart(chart)
+    else:
+        st.line_chart(chart)
+    st.dataframe(roadmap[["Time", "Event", "Impact"]], hide_index=True)
+
+# ---------- Messaging ----------
+def load_inbox(current_user_id):
+    """Accepted contacts with last message and unread count, from the conversation_inbox function."""
+    repo = get_repository()
+    try:
+        rows = repo.conversation_inbox(current_user_id)
+        st.session_state.read_receipts = True
+        return rows
+    except Exception as e:
+        if not is_missing_function(e):
+            raise
+        # Database migration not applied yet: contacts only, without previews or unread counts.
+        st.session_state.read_receipts = False
+        return [{"contact_id": contact_id, "unread_count": 0} for contact_id in repo.accepted_contacts(current_user_id)]
+
+def mark_conversation_read(inbox, window):
+    if inbox.mark_read(window.contact_id) and window.messages and st.session_state.get("read_receipts"):
+        # Written in the background; the chat renders without waiting for it.
+        get_repository().mark_read(window.user_id, window.contact_id, window.newest[0])
+
+def insert_message(repo, source, message):
+    sent = repo.insert_message(message)
+    for row in sent:
+        source.notify_sent(row)
+    return sent
+
+def send_attachment_message(repo, source, job):
+    # Runs on the upload worker, so the message is sent even if this session has gone away.
+    return insert_message(repo, source, dict(job.meta, media_url=job.media_url, media_type=job.content_type))
+
+def show_sent(sent, message):
+    get_conversation_window(st.session_state, message["sender_id"], message["receiver_id"]).merge(sent)
+    for row in sent:
+        st.session_state.live_inbox.record_sent(row)
+
+def send_message(message):
+    show_sent(insert_message(get_repository(), get_live_source(), message), message)
+
+@profiled("Messaging/chat")
+def render_chat(current_user_id, contact_options, live):
+    inbox = st.session_state.live_inbox
+    realtime = get_live_source().subscribed(current_user_id)
+    if live and realtime != st.session_state.get("live_realtime"):
+        # The subscription came up (or dropped) since the full run chose the refresh interval.
+        st.rerun()
+    if live and inbox.stale():
+        contacts = inbox.contacts
+        inbox.seed(load_inbox(current_user_id))
+        if inbox.contacts != contacts:
+            # The picker's options come from the full run.
+            st.rerun()
+    pushed = inbox.drain()
+    contact_label_by_id = {c["id"]: c["label"] for c in contact_options}
+
+    with st.expander(f"📥 Inbox ({sum(inbox.unread.values())} unread)", expanded=True):
+        for conversation in inbox.ordered()[:INBOX_PREVIEW_ROWS]:
+            contact_id = conversation["contact_id"]
+            unread = inbox.unread.get(contact_id, 0)
+            # Message text and labels come from other users: escaped, since the markup below is raw HTML.
+            preview = html.escape(conversation.get("last_text") or ("📎 Attachment" if conversation.get("last_media_type") else "No messages yet"))
+            if conversation.get("last_sender_id") == current_user_id:
+                preview = f"You: {preview}"
+            label = html.escape(str(contact_label_by_id.get(contact_id, contact_id)))
+            badge = f" 🔵 **{unread}**" if unread else ""
+            st.markdown(f"**{label}**{badge}  \n{preview}  \n<sub>{html.escape(str(conversation.get('last_at') or ''))}</sub>", unsafe_allow_html=True)
+
+    # Ids under a fixed key with plain labels: the selected option must keep its label across reruns
+    # (the browser sends back the label), so unread badges live in the inbox list above.
+    selected_contact = st.selectbox("Choose a contact", list(contact_label_by_id), format_func=contact_label_by_id.get, key="chat_contact")
+
+    # --- Load messages: pushed rows for the open conversation, otherwise only rows past the high-water mark ---
+    # Pushes alone are trusted only on a confirmed realtime subscription, and even then a
+    # periodic sync picks up anything they missed (e.g. messages sent from another device).
+    window = get_conversation_window(st.session_state, current_user_id, selected_contact)
+    pushed_here = [m for m in pushed if m["sender_id"] == selected_contact]
+    st.session_state.live_refreshes = st.session_state.get("live_refreshes", 0) + 1
+    if (live and realtime and window.loaded and inbox.unread.get(selected_contact, 0) <= len(pushed_here)
+            and st.session_state.live_refreshes % LIVE_SYNC_EVERY):
+        window.merge(pushed_here)
+    else:
+        window.sync(get_repository())
+    mark_conversation_read(inbox, window)
+
+    st.markdown("### Chat")
+    if window.has_earlier and st.button("⬆️ Load earlier messages", key="load_earlier_btn"):
+        window.load_earlier(get_repository())
+    # Filled after the send button is handled, so a sent message shows without another rerun.
+    chat_box = st.container()
+    # --- Send new message ---
+    st.subheader("Send a Message")
+    new_text = st.text_input("Type your message", key="msg_text")
+    uploaded_file = st.file_uploader("Send a file (PNG or PDF)", type=["png", "pdf"], key="msg_file")
+    if st.button("Send", key="send_btn"):
+        message = {
+            "sender_id": current_user_id,
+            "receiver_id": selected_contact,
+            "text": new_text if new_text else None,
+            "media_url": None,
+            "media_type": None
+        }
+        if uploaded_file is not None:
+            # Uploaded in the background; the pipeline inserts the message once the upload finishes.
+            on_done = functools.partial(send_attachment_message, get_repository(), get_live_source())
+            job = get_attachment_pipeline().submit(uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type,
+                                                   meta=message, on_done=on_done)
+            st.session_state.upload_jobs.append(job)
+            if not live:
+                # Send only re-ran this fragment; a full run schedules the refreshes that show progress.
+                st.rerun()
+        else:
+            send_message(message)
+    for job in list(st.session_state.upload_jobs):
+        if job.status == "done":
+            show_sent(job.result, job.meta)
+            st.session_state.upload_jobs.remove(job)
+        elif job.status == "failed":
+            st.error(f"Failed to upload {job.name}: {job.error}")
+            st.session_state.upload_jobs.remove(job)
+        else:
+            st.progress(job.progress, text=f"Uploading {job.name}…")
+    if live and realtime:
+        st.caption(f"Live updates on: new messages appear within {LIVE_REFRESH_SECONDS}s.")
+    elif live:
+        error = get_live_source().error(current_user_id)
+        if error is not None:
+            st.warning(f"Realtime updates are unavailable ({error or type(error).__name__}); checking for new messages every {LIVE_POLL_SECONDS}s instead.")
+        else:
+            st.caption(f"Live updates on: checking for new messages every {LIVE_POLL_SECONDS}s.")
+    else:
+        st.caption("Live updates off: refresh the page to see new messages.")
+    with chat_box:
+        for m in window.messages:
+            sender = "You" if m["sender_id"] == current_user_id else contact_label_by_id.get(m["sender_id"], str(m["sender_id"]))
+            if m["text"]:
+                st.markdown(f"**{html.escape(sender)}:** {html.escape(m['text'])}  \n<sub>{html.escape(str(m['created_at']))}</sub>", unsafe_allow_html=True)
+            if m.get("media_url"):
+                if content_type_is_image(m.get("media_type")):
+                    thumbnail = get_thumbnail_cache().get(m["media_url"])
+                    if thumbnail is None:
+                        st.image(m["media_url"], width=200)
+                    else:
+                        st.image(thumbnail)
+                        if st.toggle("🔍 Original", key=f"original_{m['id']}"):
+                            st.image(m["media_url"])
+                elif m.get("media_type") == "application/pdf":
+                    st.markdown(f"[📄 PDF File]({m['media_url']})")
+
+# ---------- Session State ----------
+if "authenticated" not in st.session_state:
+    st.session_state.authenticated = False
+if "user_email" not in st.session_state:
+    st.session_state.user_email = None
+if "user_data" not in st.session_state:
+    st.session_state.user_data = None
+if "selected_tool" not in st.session_state:
+    st.session_state.selected_tool = None
+if "generated_center" not in st.session_state:
+    st.session_state.generated_center = None
+if "ecomap_graph" not in st.session_state:
+    st.session_state.ecomap_graph = NetworkGraph()
+if "social_graph" not in st.session_state:
+    st.session_state.social_graph = NetworkGraph()
+if "upload_jobs" not in st.session_state:
+    st.session_state.upload_jobs = []
+if "current_genogram" not in st.session_state:
+    st.session_state.current_genogram = None
+
+# ---------- Sidebar Login/Signup ----------
+def sidebar():
+    with st.sidebar:
+        render_logo(size="small")
+        st.title("🔐 Login / Sign Up")
+        mode = st.radio("Choose Option:", ["Login", "Sign Up"])
+
+        user_store = get_user_store()
+        if mode == "Sign Up":
+            new_email = st.text_input("Email", key="signup_email")
+            new_pass = st.text_input("Password", type="password", key="signup_pass")
+            if st.button("Sign Up"):
+                if not user_store.create(new_email, hash_password(new_pass)):
+                    st.warning("User already exists.")
+                else:
+                    st.success("Account created. Please log in.")
+        else:
+            email = st.text_input("Email", key="login_email")
+            password = st.text_input("Password", type="password", key="login_password")
+            if st.button("Log In"):
+                stored_hash = user_store.get_password_hash(email)
+                if stored_hash is not None and stored_hash == hash_password(password):
+                    st.session_state.authenticated = True
+                    st.session_state.user_email = email
+                    st.session_state.user_data = load_user_data(email)
+                    # Simulate Supabase session: must be set for messaging
+                    # Here, we fake a session user dict, but in reality, you'd set this after supabase login
+                    if "user" not in st.session_state:
+                        # Use email as id fallback if not using Supabase auth
+                        st.session_state.user = {"id": email, "email": email}
+                    st.success(f"Welcome, {email}")
+                else:
+                    st.error("Invalid credentials.")
+
+# ---------- Home Tab ----------
+def home_tab():
+    render_logo()
+    st.success("🌟 Welcome to Jalinan Insan")
+    bio = st.session_state.user_data.bio
+    st.markdown(f"**Name:** {bio.get('name', 'Not set')}")
+    st.markdown(f"**Email:** {st.session_state.user_email}")
+    st.markdown(f"**Place of Birth:** {bio.get('birth_place', 'Not set')}")
+    st.success("🌟 Quote of the Day")
+    st.info(random.choice([
+        "Helping one person might not change the world, but it could change the world for one person.",
+        "Orang yang gagal akan nampak alasan pada setiap peluang, manakala orang yang berjaya akan nampak peluang dalam setiap alasan.",
+        "Act as if what you do makes a difference. It does.",
+        "You play stupid game, you win stupid prizes.",
+        "The best revenge is to forgive.",
+        "Envy eats away faith just as fire consumes wood.",
+        "Pride prevents a man from seeking knowledge.",
+        "The worst friend is he who is only with you when you are wealthy and leaves you when you are poor.",
+        "kalau tidak dipecahkan ruyung, manakan dapat sagunya.",
+        "Susah dahulu, Senang kemudian.",
+        "Berani kerana benar, takut kerana salah.",
+        "Any problems can occur at any moments, thus confirmation is important.",
+        "The past is in the past."
+    ]))
+    st.markdown("### 📰 Latest News")
+
+# ---------- Messaging Tab ----------
+@st.fragment
+@profiled("Messaging/search")
+def contact_search(current_user_id):
+    # A fragment, so typing a search does not re-run the contacts query and chat below.
+    # Answered from the in-process directory index; no backend query per keystroke.
+    st.subheader("Search Contact")
+    query = st.text_input("Search by name, email or user ID", key="search_id")
+    if query:
+        with st.spinner("Loading the user directory..."):
+            matches = [m for m in get_search_index().search(query) if m["id"] != current_user_id]
+        inbox = st.session_state.get("live_inbox")
+        contact_ids = inbox.contacts if inbox is not None else frozenset()
+        if not matches:
+            st.info("No users match this search.")
+        for match in matches:
+            label = f"**{match['name']}** · {match['email']}" if match["name"] else f"**{match['email']}**"
+            if match["id"] in contact_ids:
+                st.markdown(f"{label} — ✅ in your contacts")
+            else:
+                st.markdown(f"{label} — not a contact yet; send/accept a request first.")
+
+def messaging_tab():
+    st.header("💬 Messaging")
+    current_user_id = st.session_state["user"]["id"]
+
+    contact_search(current_user_id)
+
+    if "live_inbox" not in st.session_state or st.session_state.live_inbox.user_id != current_user_id:
+        st.session_state.live_inbox = LiveInbox(current_user_id).attach(get_live_source())
+    inbox = st.session_state.live_inbox
+    live = st.toggle("🔴 Live updates", value=True, key="live_updates")
+    # With live updates the inbox is kept current from pushed messages and re-read now and then.
+    if not live or inbox.stale():
+        inbox.seed(load_inbox(current_user_id))
+    contact_ids = [c["contact_id"] for c in inbox.ordered()]
+
+    st.subheader("Your Contacts")
+    if not contact_ids:
+        st.info("No accepted contacts yet.")
+    else:
+        # Get contact labels (email if available, else id) in one cached bulk lookup
+        contact_label_by_id = get_contact_directory().labels(contact_ids)
+        contact_options = [{"id": uid, "label": contact_label_by_id[uid]} for uid in contact_ids]
+
+        # Without a confirmed realtime subscription every refresh queries the backend, so it
+        # polls slowly. Keep refreshing quickly while uploads are in flight so their progress shows.
+        realtime = st.session_state.live_realtime = get_live_source().subscribed(current_user_id)
+        if (live and realtime) or st.session_state.upload_jobs:
+            run_every = LIVE_REFRESH_SECONDS
+        else:
+            run_every = LIVE_POLL_SECONDS if live else None
+        st.fragment(run_every=run_every)(render_chat)(current_user_id, contact_options, live)
+
+# ---------- History Tab ----------
+def history_tab():
+    st.header("📚 History")
+    user_data = st.session_state.user_data
+    col1, col2 = st.columns(2)
+    with col1:
+        type_filter = st.multiselect("Type", HISTORY_TYPES, key="history_types")
+    with col2:
+        date_filter = st.date_input("Created between", value=(), key="history_dates")
+    since = str(date_filter[0]) if len(date_filter) > 0 else None
+    until = str(date_filter[1] + timedelta(days=1)) if len(date_filter) > 1 else None
+    page = st.session_state.get("history_page", 1) - 1
+    history_index, total = user_data.history_page(page, HISTORY_PAGE_SIZE, type_filter, since, until)
+    page_count = max(1, -(-total // HISTORY_PAGE_SIZE))
+    if page >= page_count:
+        # Filters or a deletion left the page past the end; show the last page instead.
+        st.session_state.history_page = page_count
+        history_index, total = user_data.history_page(page_count - 1, HISTORY_PAGE_SIZE, type_filter, since, until)
+    if not total:
+        st.info("No saved maps yet. Create some using the Tools tab!")
+    else:
+        st.number_input(f"Page (of {page_count}, {total} saved)", min_value=1, max_value=page_count, key="history_page")
+        for item in history_index:
+            st.divider()
+            st.subheader(f"{item['type']}: {item['title']}")
+            st.caption(f"Created: {item.get('timestamp', 'Unknown')}")
+            # The DOT source / roadmap data is only fetched once an entry is opened.
+            if st.toggle("Show", key=f"show_{item['id']}"):
+                payload = user_data.history_payload(item["id"]) or {}
+                if item["type"] in ["Genogram", "Ecomap", "Social Network"]:
+                    try:
+                        render_diagram(history_dot(payload))
+                    except Exception as e:
+                        st.error(f"Could not render diagram: {str(e)}")
+                    if "genogram" in payload:
+                        st.download_button("⬇️ Export GEDCOM", "\n".join(genogram_to_gedcom(payload["genogram"])) + "\n",
+                                           file_name=f"{item['title']}.ged", key=f"export_{item['id']}")
+                    elif "graph" in payload:
+                        st.download_button("⬇️ Export CSV", "".join(graph_to_csv(item["title"], payload["graph"])),
+                                           file_name=f"{item['title']}.csv", mime="text/csv", key=f"export_{item['id']}")
+                elif item["type"] == "Life Roadmap":
+                    roadmap = user_data.history_roadmap(item["id"])
+                    if roadmap is not None:
+                        render_roadmap(roadmap, f"history_{item['id']}")
+                    else:
+                        st.warning("No data available for this roadmap")
+            if st.button(f"❌ Delete this {item['type']}", key=f"delete_{item['id']}"):
+                user_data.delete_history(item["id"])
+                st.rerun()
+
+# ---------- Biodata Tab ----------
+def biodata_tab():
+    st.header("👤 Biodata")
+    user_data = st.session_state.user_data
+    bio = user_data.bio
+    with st.form("bio_form"):
+        name = st.text_input("Full Name", value=bio.get("name", ""))
+        dob = st.date_input("Date of Birth", value=stored_date(bio.get("dob"), date(2000, 1, 1)),
+                            min_value=date(1900, 1, 1), max_value=date.today())
+        email = st.text_input("Email", value=st.session_state.user_email)
+        marital = st.selectbox("Marital Status", ["Single", "Married", "Divorced", "Widowed"])
+        birth = st.text_input("Place of Birth", value=bio.get("birth_place", ""))
+        about = st.text_area("About You", value=bio.get("about", ""))
+        work = st.text_input("Work/School", value=bio.get("work", ""))
+        if st.form_submit_button("Save"):
+            try:
+                # The version the form was filled from, so edits made elsewhere meanwhile are not overwritten.
+                user_data.save_bio({
+                    "name": name, "dob": str(dob), "email": email,
+                    "marital_status": marital, "birth_place": birth,
+                    "about": about, "work": work
+                }, expected_bio_version=st.session_state.get("bio_form_version"))
+            except VersionConflict:
+                st.warning("Your biodata was changed in another window. The latest values are loaded; review them and save again.")
+            else:
+                st.success("Saved.")
+    st.session_state.bio_form_version = user_data.bio_version
+
+# ---------- Tools Tab ----------
+@st.fragment
+def tools_tab():
+    # Runs as a fragment: adding an Ecomap edge or submitting a form reruns only the tools.
+    st.header("🧰 Tools")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        if st.button("👨‍👩‍👧‍👦 Genogram"):
+            st.session_state.selected_tool = "Genogram"
+    with col2:
+        if st.button("🌐 Ecomap"):
+            st.session_state.selected_tool = "Ecomap"
+    with col3:
+        if st.button("🤝 Social Network"):
+            st.session_state.selected_tool = "Social"
+    with col4:
+        if st.button("🛣️ Life Roadmap"):
+            st.session_state.selected_tool = "Life"
+    with col5:
+        if st.button("📥 Import"):
+            st.session_state.selected_tool = "Import"
+    tool = st.session_state.selected_tool
+    if tool:
+        with perf_run(f"Tools/{tool}"):
+            tool_section(tool)
+
+def tool_section(tool):
+    # ---------- Genogram ----------
+    if tool == "Genogram":
+        st.success("🌟 Welcome to Genogram")
+        st.header("👨‍👩‍👧‍👦 Genogram")
+        with st.expander("Start from the family form", expanded=st.session_state.current_genogram is None):
+            with st.form("genogram_form"):
+                st.subheader("Father Side")
+                father = st.text_input("Father")
+                paternal_grandfather = st.text_input("Paternal Grandfather")
+                paternal_grandmother = st.text_input("Paternal Grandmother")
+                paternal_aunts = st.text_area("Paternal Aunts (comma-separated)")
+                paternal_uncles = st.text_area("Paternal Uncles (comma-separated)")
+
+                st.subheader("Mother Side")
+                mother = st.text_input("Mother")
+                maternal_grandfather = st.text_input("Maternal Grandfather")
+                maternal_grandmother = st.text_input("Maternal Grandmother")
+                maternal_aunts = st.text_area("Maternal Aunts (comma-separated)")
+                maternal_uncles = st.text_area("Maternal Uncles (comma-separated)")
+
+                st.subheader("You")
+                user_name = st.text_input("Your Name")
+                user_spouse = st.text_input("Spouse")
+                user_siblings = st.text_area("Siblings (comma-separated)")
+                user_children = st.text_area("Children (comma-separated)")
+                submitted = st.form_submit_button("Generate Genogram")
+
+        if submitted:
+            genogram = genogram_from_form({
+                "father": father.strip(), "mother": mother.strip(),
+                "paternal_grandfather": paternal_grandfather.strip(), "paternal_grandmother": paternal_grandmother.strip(),
+                "paternal_aunts": paternal_aunts, "paternal_uncles": paternal_uncles,
+                "maternal_grandfather": maternal_grandfather.strip(), "maternal_grandmother": maternal_grandmother.strip(),
+                "maternal_aunts": maternal_aunts, "maternal_uncles": maternal_uncles,
+                "user_name": user_name.strip(), "user_spouse": user_spouse.strip(),
+                "user_siblings": user_siblings, "user_children": user_children,
+            })
+            st.session_state.current_genogram = {
+                "genogram": genogram,
+                "title": f"Genogram: {user_name}'s Family"
+            }
+
+        current = st.session_state.current_genogram
+        if current:
+            # Edits change the model in place; only the touched people/unions regenerate their DOT.
+            genogram = current["genogram"]
+            person_ids = list(genogram.people)
+
+            def person_label(pid):
+                return f"{genogram.people[pid]['name']} ({pid})"
+
+            col1, col2 = st.columns(2)
+            with col1:
+                with st.form("genogram_add", clear_on_submit=True):
+                    st.subheader("Add Relative")
+                    relation = st.selectbox("Relation", RELATIONS)
+                    relative_of = st.selectbox("Of", person_ids, format_func=person_label)
+                    new_name = st.text_input("Name")
+                    new_gender = st.selectbox("Gender", list(GENDER_LABELS), format_func=GENDER_LABELS.get)
+                    if st.form_submit_button("➕ Add") and new_name.strip():
+                        try:
+                            genogram.add_relative(relation, relative_of, new_name.strip(), new_gender)
+                        except ValueError as e:
+                            st.error(str(e))
+            with col2:
+                with st.form("genogram_edit"):
+                    st.subheader("Edit Person")
+                    person = st.selectbox("Person", person_ids, format_func=person_label)
+                    edit_name = st.text_input("New name (leave blank to keep)")
+                    edit_gender = st.selectbox("Gender", [None] + list(GENDER_LABELS), format_func=lambda g: "Keep" if g is None else GENDER_LABELS[g])
+                    edit_col, remove_col = st.columns(2)
+                    if edit_col.form_submit_button("✏️ Update"):
+                        genogram.edit_person(person, edit_name.strip() or None, edit_gender)
+                    if remove_col.form_submit_button("🗑️ Remove"):
+                        try:
+                            genogram.remove_person(person)
+                        except ValueError as e:
+                            st.error(str(e))
+            st.caption(f"{len(genogram.people)} people across {genogram.generation_count()} generations")
+            render_diagram(genogram.to_dot())
+
+            if st.button("💾 Save to History", key="save_genogram"):
+                history_entry = {
+                    "type": "Genogram",
+                    "title": current["title"],
+                    "genogram": genogram.to_dict(),
+                    "timestamp": str(datetime.now())
+                }
+                save_to_history(history_entry)
+                st.success(f"Saved {history_entry['title']} to history!")
+                st.session_state.current_genogram = None
+    # ---------- Ecomap ----------
+    elif tool == "Ecomap":
+        st.success("🌟 Welcome to Ecomap")
+        st.subheader("🌐 Ecomap Tool")
+        center = st.session_state.generated_center or st.text_input("Family Member (center)", value="You")
+        col1, col2 = st.columns(2)
+        with col1:
+            name = st.text_input("Relation factor")
+            entity_type = st.selectbox("Relation Type", ["Person", "Work/School", "Pet", "Agency"])
+            relation = st.radio("Relation Outcome", ["Positive", "Negative", "Complicated"], horizontal=True)
+            direction = st.radio("Relation Direction", ["From user →", "To user ←"], horizontal=True)
+            if st.button("➕ Add Connection") and name:
+                node_attrs, edge_attrs = connection_attrs(relation, entity_type)
+                st.session_state.ecomap_graph.add_connection(center, name, direction == "From user →", node_attrs, edge_attrs)
+            connected = st.session_state.ecomap_graph.neighbours(center)
+            if connected:
+                st.selectbox("Connection to remove", connected, key="ecomap_remove")
+                # Removed in the click callback, before the fragment re-runs and rebuilds the selectbox.
+                st.button("➖ Remove Connection", key="remove_ecomap", on_click=remove_connection,
+                          args=("ecomap_graph", center, "ecomap_remove"))
+        with col2:
+            st.graphviz_chart(st.session_state.ecomap_graph.to_dot())
+            if st.button("💾 Save to History", key="save_ecomap"):
+                title = f"Ecomap: {center}'s Connections"
+                history_entry = {
+                    "type": "Ecomap",
+                    "title": title,
+                    "graph": st.session_state.ecomap_graph.to_dict(),
+                    "timestamp": str(datetime.now())
+                }
+                save_to_history(history_entry)
+                st.success(f"Saved {title} to history!")
+            if st.button("🔄 Reset Ecomap", key="reset_ecomap"):
+                st.session_state.ecomap_graph = NetworkGraph()
+
+    # ---------- Social Network ----------
+    elif tool == "Social":
+        st.success("🌟 Welcome to Social Network Diagram")
+        st.header("🫂 Social Network")
+        center = st.text_input("Your Name (center)", value="You")
+        col1, col2 = st.columns(2)
+        with col1:
+            name = st.text_input("Connection Name")
+            entity_type = st.selectbox("Entity Type", ["Person", "Work/School", "Pet", "Agency"])
+            relation = st.radio("Relationship Type", ["Positive", "Negative", "Complicated"], horizontal=True)
+            direction = st.radio("Support Direction", ["From user →", "To user ←"], horizontal=True)
+            if st.button("➕ Add Connection") and name:
+                node_attrs, edge_attrs = connection_attrs(relation, entity_type)
+                st.session_state.social_graph.add_connection(center, name, direction == "From user →", node_attrs, edge_attrs)
+            connected = st.session_state.social_graph.neighbours(center)
+            if connected:
+                st.selectbox("Connection to remove", connected, key="social_remove")
+                # Removed in the click callback, before the fragment re-runs and rebuilds the selectbox.
+                st.button("➖ Remove Connection", key="remove_social", on_click=remove_connection,
+                          args=("social_graph", center, "social_remove"))
+        with col2:
+            st.graphviz_chart(st.session_state.social_graph.to_dot())
+            if st.button("💾 Save to History", key="save_social"):
+                title = f"Social Network: {center}"
+                history_entry = {
+                    "type": "Social Network",
+                    "title": title,
+                    "graph": st.session_state.social_graph.to_dict(),
+                    "timestamp": str(datetime.now())
+                }
+                save_to_history(history_entry)
+                st.success(f"Saved {title} to history!")
+            if st.button("🔄 Reset Social Network", key="reset_social"):
+                st.session_state.social_graph = NetworkGraph()
+
+    # ---------- Bulk Import ----------
+    elif tool == "Import":
+        st.success("🌟 Welcome to Bulk Import")
+        st.subheader("📥 Import Genograms and Network Maps")
+        st.caption("GEDCOM (.ged) files become a Genogram. CSV edge lists need `source` and `target` columns; "
+                   "optional `map` (one saved map per value), `relation` (Positive/Negative/Complicated), `entity_type` "
+                   "and `center` (the endpoint drawn as the user, as in exported maps).")
+        import_file = st.file_uploader("File", type=["ged", "csv"], key="import_file")
+        import_title = st.text_input("Title", value=import_file.name.rsplit(".", 1)[0] if import_file else "")
+        csv_type = st.selectbox("Save CSV maps as", ["Ecomap", "Social Network"])
+        if st.button("📥 Import to History", key="import_btn") and import_file is not None:
+            lines = text_lines(import_file)
+            if import_file.name.lower().endswith(".ged"):
+                entries = gedcom_entries(lines, f"Genogram: {import_title}")
+            else:
+                entries = csv_entries(lines, csv_type, f"{csv_type}: {import_title}")
+            with st.spinner("Importing..."), span("io", "bulk import"):
+                saved = import_entries(st.session_state.user_data, entries)
+            st.success(f"Imported {saved} map(s) to history!")
+
+    # ---------- Life Roadmap ----------
+    elif tool == "Life":
+        st.success("🌟 Welcome to Life Roadmap")
+        st.subheader("🛣️ Life Roadmap")
+        with st.form("life_form", clear_on_submit=True):
+            time = st.text_input("Time (Year/Age)", placeholder="e.g., 2023 or Age 25")
+            event = st.text_input("Event", placeholder="e.g., Graduated from University")
+            impact = st.slider("Impact", -10, 10, 0)
+            submitted_life = st.form_submit_button("➕ Add Event")
+            if submitted_life and time and event:
+                st.session_state.user_data.add_lifemap_event(time, event, impact)
+        roadmap = st.session_state.user_data.roadmap
+        if len(roadmap):
+            st.subheader("Your Life Roadmap")
+            render_roadmap(roadmap, "life")
+            if st.button("💾 Save to History", key="save_life"):
+                from roadmap import frame_to_columns
+
+                title = f"Life Roadmap: {st.session_state.user_data.bio.get('name', 'My Life')}"
+                history_entry = {
+                    "type": "Life Roadmap",
+                    "title": title,
+                    "columns": frame_to_columns(roadmap),
+                    "timestamp": str(datetime.now())
+                }
+                save_to_history(history_entry)
+                st.success(f"Saved {title} to history!")
+
+
+# ---------- Main App ----------
+def main():
+    if st.session_state.authenticated and "user" in st.session_state:
+        # Pick up writes made by other sessions and server processes.
+        st.session_state.user_data.refresh()
+        # Only the selected section runs on each rerun (st.tabs executes every tab body).
+        SECTIONS = {"🏠 Home": home_tab, "💬 Messaging": messaging_tab, "📚 History": history_tab, "👤 Biodata": biodata_tab, "🧰 Tools": tools_tab}
+        section = st.radio("Section", list(SECTIONS), horizontal=True, key="active_section", label_visibility="collapsed")
+        with perf_run(section.split(" ", 1)[1]):
+            SECTIONS[section]()
+
+    else:
+        render_logo()
+        st.title("👥 Jalinan Insan")
+        st.info("Please log in or sign up to access the app features. Use the sidebar to log in or create a new account.")
+
+def debug_panel():
+    with st.sidebar.expander("🛠️ Debug", expanded=st.session_state.get("debug_panel", False)):
+        st.toggle("Profile my reruns", key="debug_panel")
+        profiles = st.session_state.get("perf_profiles", [])
+        if not profiles:
+            st.caption("Turn profiling on; the next rerun is timed here.")
+            return
+        record = profiles[-1].to_record()
+        st.caption(f"Last run ({record['run']}): {record['total_ms']:.1f} ms")
+        st.dataframe([{"kind": kind, **totals} for kind, totals in record["kinds"].items()], hide_index=True)
+        st.dataframe(record["spans"], hide_index=True)
+        metrics = get_perf_metrics()
+        st.caption(f"Process totals over {metrics.runs} profiled run(s)")
+        st.dataframe(metrics.snapshot(), hide_index=True)
+        st.download_button("⬇️ Export (JSON)", json.dumps({"recent": [p.to_record() for p in profiles], "process": metrics.snapshot()}),
+                           file_name="perf_metrics.json", mime="application/json")
+
+with perf_run("app"):
+    get_change_feed().poll()
+    sidebar()
+    main()
+if st.session_state.user_email in ADMIN_EMAILS:
+    debug_panel()
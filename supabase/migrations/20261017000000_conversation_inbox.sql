@@ -0,0 +1,69 @@
+-- Conversation inbox: one row per accepted contact with the last message and
+-- the number of unread messages, computed server-side in a single call.
+
+create table if not exists public.message_reads (
+    user_id text not null,
+    contact_id text not null,
+    last_read_at timestamptz not null default 'epoch',
+    primary key (user_id, contact_id)
+);
+
+-- Both directions of a conversation are read newest-first.
+create index if not exists messages_sender_receiver_created_at
+    on public.messages (sender_id, receiver_id, created_at desc);
+create index if not exists messages_receiver_sender_created_at
+    on public.messages (receiver_id, sender_id, created_at desc);
+
+create or replace function public.conversation_inbox(uid text)
+returns table (
+    contact_id text,
+    last_text text,
+    last_media_type text,
+    last_sender_id text,
+    last_at timestamptz,
+    unread_count bigint
+)
+language sql
+stable
+as $$
+    with my_contacts as (
+        select case when c.requester_id = uid then c.requestee_id else c.requester_id end as contact_id
+        from public.contacts c
+        where c.status = 'accepted'
+          and (c.requester_id = uid or c.requestee_id = uid)
+    )
+    select
+        mc.contact_id,
+        last_message.text,
+        last_message.media_type,
+        last_message.sender_id,
+        last_message.created_at,
+        coalesce(unread.n, 0)
+    from my_contacts mc
+    left join lateral (
+        select * from (
+            (select m.text, m.media_type, m.sender_id, m.created_at
+             from public.messages m
+             where m.sender_id = uid and m.receiver_id = mc.contact_id
+             order by m.created_at desc limit 1)
+            union all
+            (select m.text, m.media_type, m.sender_id, m.created_at
+             from public.messages m
+             where m.sender_id = mc.contact_id and m.receiver_id = uid
+             order by m.created_at desc limit 1)
+        ) both_directions
+        order by created_at desc
+        limit 1
+    ) last_message on true
+    left join lateral (
+        select count(*) as n
+        from public.messages m
+        where m.sender_id = mc.contact_id
+          and m.receiver_id = uid
+          and m.created_at > coalesce(
+              (select r.last_read_at from public.message_reads r
+               where r.user_id = uid and r.contact_id = mc.contact_id),
+              'epoch')
+    ) unread on true
+    order by last_message.created_at desc nulls last;
+$$;
@@ -0,0 +1,110 @@
+import io
+import time
+
+import pytest
+
+import attachments
+from attachments import AttachmentPipeline, LocalStorage, ThumbnailCache, thumbnail_path
+
+PUBLIC_URL = "http://storage.test/public/chat_files"
+
+
+def png_bytes(size=(400, 300)):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", size, "red").save(out, format="PNG")
+    return out.getvalue()
+
+
+def wait(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.status in ("queued", "uploading"):
+        assert time.monotonic() < deadline, "upload did not finish"
+        time.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path / "storage"))
+
+
+def test_upload_stores_file_thumbnail_and_runs_on_done(storage):
+    pipeline = AttachmentPipeline(storage, PUBLIC_URL, chunk_size=1024)
+    data = png_bytes()
+    job = wait(pipeline.submit("photo.png", data, "image/png", meta={"to": "c"}, on_done=lambda job: ("sent", job.meta)))
+    assert job.status == "done" and job.progress == 1.0
+    assert job.sent == len(data)
+    assert job.media_url == f"{PUBLIC_URL}/{job.filename}"
+    assert job.result == ("sent", {"to": "c"})
+    bucket = storage.from_("chat_files")
+    assert bucket.download(job.filename) == data
+    assert bucket.download(thumbnail_path(job.filename))[:4] == b"\x89PNG"
+
+
+def test_unreadable_image_uploads_without_thumbnail(storage):
+    pipeline = AttachmentPipeline(storage, PUBLIC_URL)
+    job = wait(pipeline.submit("broken.png", b"\x89PNG not really", "image/png"))
+    assert job.status == "done"
+    with pytest.raises(FileNotFoundError):
+        storage.from_("chat_files").download(thumbnail_path(job.filename))
+
+
+def test_on_done_failure_fails_the_job(storage):
+    def on_done(job):
+        raise RuntimeError("insert failed")
+
+    job = wait(AttachmentPipeline(storage, PUBLIC_URL).submit("doc.pdf", b"%PDF", "application/pdf", on_done=on_done))
+    assert job.status == "failed" and job.error == "insert failed"
+
+
+def test_thumbnail_cache_reads_through_and_is_bounded(storage, tmp_path):
+    bucket = storage.from_("chat_files")
+    for name in ("a.png", "b.png"):
+        bucket.upload(thumbnail_path(name), b"x" * 100)
+    cache = ThumbnailCache(storage, PUBLIC_URL, directory=str(tmp_path / "cache"), max_bytes=150)
+    assert cache.get(f"{PUBLIC_URL}/a.png") == b"x" * 100
+    assert cache.get(f"{PUBLIC_URL}/b.png") == b"x" * 100
+    # Only the most recently used thumbnail fits in 150 bytes.
+    assert len(cache._sizes) == 1
+    assert cache.get(f"{PUBLIC_URL}/missing.png") is None
+    assert cache.get("https://elsewhere/a.png") is None
+
+
+def test_client_file_names_cannot_add_directories(storage, tmp_path):
+    job = wait(AttachmentPipeline(storage, PUBLIC_URL).submit("../../../escape.txt", b"data", "text/plain"))
+    assert job.status == "done"
+    assert "/" not in job.filename and job.filename.endswith("_escape.txt")
+    assert not (tmp_path / "escape.txt").exists()
+    assert storage.from_("chat_files").download(job.filename) == b"data"
+
+
+class FlakyStorage:
+    def __init__(self, storage, error):
+        self.storage = storage
+        self.error = error
+
+    def from_(self, bucket):
+        flaky = self
+
+        class Bucket:
+            def download(self, path):
+                if flaky.error is not None:
+                    raise flaky.error
+                return flaky.storage.from_(bucket).download(path)
+        return Bucket()
+
+
+def test_thumbnail_cache_only_remembers_missing_objects(storage, tmp_path, monkeypatch):
+    storage.from_("chat_files").upload(thumbnail_path("a.png"), b"thumb")
+    flaky = FlakyStorage(storage, ConnectionError("network down"))
+    cache = ThumbnailCache(flaky, PUBLIC_URL, directory=str(tmp_path / "cache"))
+    assert cache.get(f"{PUBLIC_URL}/a.png") is None
+    flaky.error = None
+    assert cache.get(f"{PUBLIC_URL}/a.png") == b"thumb"
+
+    monkeypatch.setattr(attachments, "THUMBNAIL_MISSING_MAX", 2)
+    for name in ("x.png", "y.png", "z.png"):
+        assert cache.get(f"{PUBLIC_URL}/{name}") is None
+    assert list(cache._missing) == [f"{PUBLIC_URL}/y.png", f"{PUBLIC_URL}/z.png"]
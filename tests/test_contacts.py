@@ -0,0 +1,104 @@
+from contacts import ContactDirectory, ContactSearchIndex
+from data_access import InMemoryRepository
+
+
+def make_repo(*ids):
+    repo = InMemoryRepository()
+    repo.tables["users"] = [{"id": uid, "email": f"{uid}@x.com"} for uid in ids]
+    return repo
+
+
+def test_directory_caches_labels():
+    repo = make_repo("a", "b")
+    directory = ContactDirectory(repo)
+    assert directory.labels(["a", "b", "ghost"]) == {"a": "a@x.com", "b": "b@x.com", "ghost": "ghost"}
+    assert directory.label("a") == "a@x.com"
+    assert repo.query_count == 1
+
+
+def test_directory_invalidate_refetches():
+    repo = make_repo("a")
+    directory = ContactDirectory(repo)
+    assert directory.label("new") == "new"
+    repo.tables["users"].append({"id": "new", "email": "new@x.com"})
+    directory.invalidate(["new"])
+    assert directory.label("new") == "new@x.com"
+
+
+def test_directory_ttl_expiry():
+    repo = make_repo("a")
+    directory = ContactDirectory(repo, ttl=0)
+    directory.label("a")
+    directory.label("a")
+    assert repo.query_count == 2
+
+
+def test_directory_is_bounded():
+    directory = ContactDirectory(make_repo(*"abcdef"), max_entries=3)
+    directory.labels(list("abcdef"))
+    assert len(directory._entries) <= 3
+
+
+def make_index(names=None, **kwargs):
+    repo = make_repo("john", "mary", "ahmad")
+    names = dict(names or {"john@x.com": "John Smith", "mary@x.com": "Mary Tan"})
+    index = ContactSearchIndex(repo, lambda emails: {e: n for e, n in names.items() if emails is None or e in emails}, **kwargs)
+    return repo, names, index
+
+
+def found(results):
+    return [r["id"] for r in results]
+
+
+def test_search_by_prefix_of_name_email_and_id():
+    _, _, index = make_index()
+    assert found(index.search("smi")) == ["john"]
+    assert found(index.search("MARY t")) == ["mary"]
+    assert found(index.search("ahmad@")) == ["ahmad"]
+    assert index.search("   ") == []
+
+
+def test_search_tolerates_typos():
+    _, _, index = make_index()
+    assert found(index.search("jhon")) == ["john"]
+    assert found(index.search("smoth")) == ["john"]
+
+
+def test_search_loads_once_and_applies_changes():
+    repo, names, index = make_index()
+    index.search("j")
+    queries = repo.query_count
+    index.search("ma")
+    assert repo.query_count == queries
+
+    repo.tables["users"].append({"id": "zed", "email": "zed@x.com"})
+    index.users_changed({"zed"})
+    names["mary@x.com"] = "Mary Lim"
+    index.names_changed({"mary@x.com"})
+    assert found(index.search("zed")) == ["zed"]
+    assert found(index.search("lim")) == ["mary"]
+    assert index.search("tan") == []
+
+
+def test_search_index_is_bounded():
+    _, _, index = make_index(max_users=2)
+    index.search("x")
+    assert len(index) == 2
+
+
+def test_changes_during_a_reload_are_kept():
+    repo, names, index = make_index()
+    index.search("j")
+    read_directory = repo.directory_users
+
+    def directory_users(limit=None):
+        rows = read_directory(limit)
+        # A sign-up is applied while the reload is still reading.
+        repo.tables["users"].append({"id": "zed", "email": "zed@x.com"})
+        index.users_changed({"zed"})
+        index.search("z")
+        return rows
+
+    repo.directory_users = directory_users
+    index.load()
+    assert found(index.search("zed")) == ["zed"]
@@ -0,0 +1,84 @@
+import pytest
+
+import data_access
+from data_access import DataAccessError, InMemoryRepository, is_missing_function
+
+
+def make_repo(**kwargs):
+    kwargs.setdefault("backoff", 0)
+    return InMemoryRepository(**kwargs)
+
+
+def test_transient_failures_are_retried():
+    repo = make_repo(retries=2)
+    repo.tables["users"] = [{"id": "a", "email": "a@x"}]
+    repo.fail_next = 2
+    assert repo.user_emails(["a"]) == {"a": "a@x"}
+    assert repo.query_count == 3
+
+
+def test_retries_give_up_with_data_access_error():
+    repo = make_repo(retries=1)
+    repo.fail_next = 5
+    with pytest.raises(DataAccessError):
+        repo.accepted_contacts("a")
+    assert repo.query_count == 2
+
+
+def test_non_transient_errors_are_not_retried():
+    repo = make_repo()
+
+    def broken(user_id):
+        repo._query()
+        raise KeyError("missing table")
+
+    repo._accepted_contacts = broken
+    with pytest.raises(KeyError):
+        repo.accepted_contacts("a")
+    assert repo.query_count == 1
+
+
+def test_slow_query_times_out():
+    repo = make_repo(latency=0.5, timeout=0.05)
+    with pytest.raises(DataAccessError):
+        repo.accepted_contacts("a")
+
+
+def test_user_emails_batches_and_skips_unknown_ids(monkeypatch):
+    monkeypatch.setattr(data_access, "LOOKUP_BATCH_SIZE", 2)
+    repo = make_repo()
+    repo.tables["users"] = [{"id": f"u{i}", "email": f"u{i}@x"} for i in range(5)]
+    found = repo.user_emails([f"u{i}" for i in range(5)] + ["ghost"])
+    assert found == {f"u{i}": f"u{i}@x" for i in range(5)}
+    assert repo.query_count == 3
+
+
+def test_directory_users_pages_in_id_order(monkeypatch):
+    monkeypatch.setattr(data_access, "DIRECTORY_PAGE_SIZE", 3)
+    repo = make_repo()
+    repo.tables["users"] = [{"id": f"u{i}", "email": f"u{i}@x"} for i in (4, 0, 3, 1, 2, 5, 6)]
+    assert [row["id"] for row in repo.directory_users()] == [f"u{i}" for i in range(7)]
+    assert [row["id"] for row in repo.directory_users(limit=4)] == ["u0", "u1", "u2", "u3"]
+
+
+def test_conversation_inbox_counts_unread_after_read_position():
+    repo = make_repo()
+    repo.tables["contacts"] = [{"requester_id": "me", "requestee_id": "c", "status": "accepted"}]
+    repo.tables["messages"] = [
+        {"id": 1, "sender_id": "c", "receiver_id": "me", "text": "one", "created_at": "2024-01-01"},
+        {"id": 2, "sender_id": "c", "receiver_id": "me", "text": "two", "created_at": "2024-01-02"},
+        {"id": 3, "sender_id": "x", "receiver_id": "y", "text": "other", "created_at": "2024-01-03"},
+    ]
+    repo.mark_read("me", "c", "2024-01-01").result()
+    (row,) = repo.conversation_inbox("me")
+    assert row["contact_id"] == "c"
+    assert row["last_text"] == "two"
+    assert row["unread_count"] == 1
+
+
+def test_only_a_missing_function_counts_as_an_unapplied_migration():
+    APIError = pytest.importorskip("postgrest.exceptions").APIError
+    assert is_missing_function(APIError({"code": "PGRST202", "message": "Could not find the function"}))
+    assert is_missing_function(APIError({"code": "42883", "message": "function does not exist"}))
+    assert not is_missing_function(APIError({"code": "42501", "message": "permission denied"}))
+    assert not is_missing_function(KeyError("bug"))
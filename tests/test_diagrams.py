@@ -0,0 +1,93 @@
+import threading
+
+from diagrams import NetworkGraph, RenderCache, connection_attrs
+
+
+class Layout:
+    """Stand-in for Graphviz that counts calls and can be held until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, dot):
+        self.calls.append(dot)
+        self.release.wait(5)
+        return f"<svg>{dot}</svg>"
+
+
+def test_render_caches_by_dot_and_is_bounded():
+    layout = Layout()
+    cache = RenderCache(max_entries=2, layout=layout)
+    assert cache.render("a") == "<svg>a</svg>"
+    assert cache.render("a") == "<svg>a</svg>"
+    assert layout.calls == ["a"]
+    cache.render("b")
+    cache.render("a")  # a is now the most recently used
+    cache.render("c")
+    assert cache.get("a") and cache.get("c")
+    assert cache.get("b") is None
+
+
+def test_concurrent_misses_lay_out_once():
+    layout = Layout()
+    layout.release.clear()
+    cache = RenderCache(layout=layout)
+    cache.prerender("a")
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(cache.render("a")))
+    waiter.start()
+    layout.release.set()
+    waiter.join(5)
+    assert results == ["<svg>a</svg>"]
+    assert layout.calls == ["a"]
+
+
+def test_slow_layout_times_out_and_is_cached_later():
+    layout = Layout()
+    layout.release.clear()
+    cache = RenderCache(layout=layout)
+    assert cache.render("a", timeout=0.01) is None
+    layout.release.set()
+    assert cache.render("a") == "<svg>a</svg>"
+    assert layout.calls == ["a"]
+
+
+def connect(graph, name, relation="Positive", outgoing=True, center="You"):
+    graph.add_connection(center, name, outgoing, *connection_attrs(relation, "Person"))
+
+
+def test_readding_a_connection_updates_it_in_place():
+    graph = NetworkGraph()
+    connect(graph, "Ann")
+    connect(graph, "Ann", relation="Negative", outgoing=False)
+    assert list(graph.edges.values()) == [("Ann", "You", connection_attrs("Negative", "Person")[1])]
+    assert graph.nodes["Ann"]["color"] == "red"
+    assert graph.to_dot().count("->") == 1
+
+
+def test_remove_connection_drops_nodes_left_unconnected():
+    graph = NetworkGraph()
+    connect(graph, "Ann")
+    connect(graph, "Bob")
+    connect(graph, "Bob", center="Ann")
+    assert sorted(graph.neighbours("Ann")) == ["Bob", "You"]
+    assert graph.remove_connection("You", "Ann")
+    assert not graph.remove_connection("You", "Ann")
+    # Ann is still connected to Bob, so both stay.
+    assert set(graph.nodes) == {"You", "Ann", "Bob"}
+    assert graph.remove_connection("Bob", "Ann")
+    assert set(graph.nodes) == {"You", "Bob"}
+    assert graph.remove_connection("You", "Bob")
+    assert graph.nodes == {} and graph.edges == {}
+
+
+def test_graph_dict_round_trip_keeps_degrees():
+    graph = NetworkGraph()
+    connect(graph, "Ann")
+    connect(graph, "Bob", outgoing=False)
+    restored = NetworkGraph.from_dict(graph.to_dict())
+    assert restored.to_dot() == graph.to_dot()
+    assert restored.remove_connection("Bob", "You")
+    assert set(restored.nodes) == {"You", "Ann"}
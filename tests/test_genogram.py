@@ -0,0 +1,97 @@
+import pytest
+
+from genogram import Genogram, genogram_from_form
+
+
+def names(genogram, pids):
+    return sorted(genogram.people[pid]["name"] for pid in pids)
+
+
+def test_add_relative_links_unions_and_generations():
+    genogram = Genogram()
+    you = genogram.add_person("You")
+    dad = genogram.add_relative("Parent of", you, "Dad", "M")
+    mum = genogram.add_relative("Parent of", you, "Mum", "F")
+    sis = genogram.add_relative("Sibling of", you, "Sis", "F")
+    spouse = genogram.add_relative("Partner of", you, "Sam")
+    kid = genogram.add_relative("Child of", you, "Kid")
+    parents = genogram.unions[genogram.parent_union[you]]
+    assert names(genogram, parents["partners"]) == ["Dad", "Mum"]
+    assert names(genogram, parents["children"]) == ["Sis", "You"]
+    assert genogram.unions[genogram.parent_union[kid]]["partners"] == [you, spouse]
+    generations = {genogram.people[pid]["name"]: genogram.people[pid]["generation"] for pid in (dad, mum, sis, spouse, kid)}
+    assert generations == {"Dad": -1, "Mum": -1, "Sis": 0, "Sam": 0, "Kid": 1}
+    assert genogram.generation_count() == 3
+
+
+def test_add_relative_rejects_a_third_parent_and_unknown_relations():
+    genogram = Genogram()
+    you = genogram.add_person("You")
+    genogram.add_relative("Parent of", you, "Dad")
+    genogram.add_relative("Parent of", you, "Mum")
+    with pytest.raises(ValueError):
+        genogram.add_relative("Parent of", you, "Third")
+    with pytest.raises(ValueError):
+        genogram.add_relative("Cousin of", you, "Cuz")
+    assert len(genogram.people) == 3
+
+
+def test_remove_person_detaches_unions():
+    genogram = Genogram()
+    you = genogram.add_person("You")
+    spouse = genogram.add_relative("Partner of", you, "Sam")
+    child = genogram.add_relative("Child of", you, "Kid")
+    genogram.remove_person(spouse)
+    (union,) = genogram.unions.values()
+    assert union["partners"] == [you] and union["children"] == [child]
+    genogram.remove_person(child)
+    assert union["children"] == [] and genogram.parent_union == {}
+    assert "Kid" not in genogram.to_dot()
+
+
+def test_last_person_cannot_be_removed():
+    genogram = Genogram()
+    you = genogram.add_person("You")
+    with pytest.raises(ValueError):
+        genogram.remove_person(you)
+    assert list(genogram.people) == [you]
+
+
+def test_rank_generations_from_unions():
+    genogram = Genogram()
+    grandpa, grandma, dad, mum, you = (genogram.add_person(name) for name in ("Grandpa", "Grandma", "Dad", "Mum", "You"))
+    top = genogram.add_union([grandpa, grandma])
+    genogram.unions[top]["children"].append(dad)
+    genogram.parent_union[dad] = top
+    family = genogram.add_union([dad, mum])
+    genogram.unions[family]["children"].append(you)
+    genogram.parent_union[you] = family
+    genogram.rank_generations()
+    ranks = {person["name"]: person["generation"] for person in genogram.people.values()}
+    assert ranks == {"Grandpa": 0, "Grandma": 0, "Dad": 1, "Mum": 1, "You": 2}
+    assert genogram.generation_count() == 3
+
+
+def test_form_keeps_grandparents_when_a_parent_is_blank():
+    fields = dict.fromkeys(("father", "mother", "paternal_grandfather", "paternal_grandmother", "paternal_aunts",
+                            "paternal_uncles", "maternal_grandfather", "maternal_grandmother", "maternal_aunts",
+                            "maternal_uncles", "user_name", "user_spouse", "user_siblings", "user_children"), "")
+    fields.update(user_name="Me", mother="Mum", paternal_grandfather="Grandpa")
+    genogram = genogram_from_form(fields)
+    assert names(genogram, genogram.people) == ["Grandpa", "Me", "Mum", "Unknown father"]
+    (father,) = genogram.find("Unknown father")
+    assert names(genogram, genogram.unions[genogram.parent_union[father]]["partners"]) == ["Grandpa"]
+
+
+def test_dict_round_trip_keeps_the_model():
+    genogram = Genogram()
+    you = genogram.add_person("You")
+    genogram.add_relative("Parent of", you, "Dad", "M")
+    genogram.add_relative("Child of", you, "Kid")
+    restored = Genogram.from_dict(genogram.to_dict())
+    assert restored.people == genogram.people
+    assert restored.unions == genogram.unions
+    assert restored.parent_union == genogram.parent_union
+    assert restored.to_dot() == genogram.to_dot()
+    # New ids continue after the restored ones.
+    assert restored.add_person("New") not in genogram.people
@@ -0,0 +1,56 @@
+import json
+import logging
+
+from instrumentation import PERF_LOGGER, ProcessMetrics, profiled_run, span, timed
+
+
+@timed("db")
+def query():
+    return "rows"
+
+
+def run(metrics=None, **kwargs):
+    finished = []
+    with profiled_run("main", True, session="s1", metrics=metrics, on_finish=finished.append, **kwargs):
+        with span("section", "chat"):
+            assert query() == "rows"
+            with profiled_run("fragment", True):
+                query()
+    return finished[0]
+
+
+def test_spans_are_noops_without_an_active_profile():
+    finished = []
+    with span("db", "outside"):
+        assert query() == "rows"
+    with profiled_run("off", False, on_finish=finished.append):
+        query()
+    assert finished == []
+
+
+def test_profiled_run_collects_spans_and_nests_runs_as_sections():
+    profile = run()
+    assert profile.total_ms is not None
+    totals = profile.totals()
+    assert totals[("db", "query")][0] == 2
+    assert totals[("section", "chat")][0] == 1
+    assert totals[("section", "fragment")][0] == 1
+    record = profile.to_record()
+    assert record["run"] == "main" and record["session"] == "s1"
+    assert record["kinds"]["db"]["count"] == 2
+
+
+def test_process_metrics_accumulate_across_runs():
+    metrics = ProcessMetrics()
+    run(metrics)
+    run(metrics)
+    assert metrics.runs == 2
+    (db,) = [row for row in metrics.snapshot() if row["kind"] == "db"]
+    assert db["name"] == "query" and db["count"] == 4
+
+
+def test_finished_runs_are_logged_as_json(caplog):
+    with caplog.at_level(logging.INFO, logger=PERF_LOGGER):
+        run(log=True)
+    (message,) = [r.getMessage() for r in caplog.records if r.name == PERF_LOGGER]
+    assert json.loads(message)["run"] == "main"
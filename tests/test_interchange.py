@@ -0,0 +1,83 @@
+import io
+
+from diagrams import NetworkGraph, connection_attrs
+from genogram import genogram_from_form
+from interchange import (csv_entries, genogram_from_gedcom, genogram_to_gedcom, graph_to_csv, graphs_from_csv,
+                         import_entries, text_lines)
+
+FORM = {
+    "father": "Dad", "mother": "Mum",
+    "paternal_grandfather": "Grandpa", "paternal_grandmother": "",
+    "paternal_aunts": "Ann", "paternal_uncles": "",
+    "maternal_grandfather": "", "maternal_grandmother": "Nana",
+    "maternal_aunts": "", "maternal_uncles": "Bob, Carl",
+    "user_name": "Me", "user_spouse": "Sam",
+    "user_siblings": "Sis", "user_children": "Kid",
+}
+
+
+def family(genogram):
+    """Names, genders and (parents -> children) by name, independent of ids."""
+    names = {pid: person["name"] for pid, person in genogram.people.items()}
+    people = sorted((person["name"], person["gender"]) for person in genogram.people.values())
+    unions = sorted((tuple(sorted(names[p] for p in union["partners"])), tuple(sorted(names[c] for c in union["children"])))
+                    for union in genogram.unions.values() if union["partners"] or union["children"])
+    return people, unions
+
+
+def test_gedcom_round_trip():
+    genogram = genogram_from_form(FORM)
+    lines = list(genogram_to_gedcom(genogram.to_dict()))
+    assert lines[0] == "0 HEAD" and lines[-1] == "0 TRLR"
+    assert family(genogram_from_gedcom(line + "\n" for line in lines)) == family(genogram)
+
+
+def test_gedcom_import_handles_forward_references():
+    lines = ["0 HEAD", "0 @F1@ FAM", "1 HUSB @I1@", "1 CHIL @I2@", "0 @I1@ INDI", "1 NAME John /Smith/", "1 SEX M",
+             "0 @I2@ INDI", "1 NAME Jane /Smith/", "1 SEX F", "0 TRLR"]
+    genogram = genogram_from_gedcom(lines)
+    assert family(genogram) == ([("Jane Smith", "F"), ("John Smith", "M")], [(("John Smith",), ("Jane Smith",))])
+
+
+def ecomap():
+    graph = NetworkGraph()
+    graph.add_connection("You", "Boss", False, *connection_attrs("Negative", "Work/School"))
+    graph.add_connection("You", "Ann", True, *connection_attrs("Positive", "Person"))
+    graph.add_connection("You", "Club", True, *connection_attrs("Complicated", "Agency"))
+    return graph
+
+
+def test_csv_round_trip_keeps_center_and_directions():
+    graph = ecomap()
+    text = "".join(graph_to_csv("Ecomap: mine", graph.to_dict()))
+    ((title, imported),) = graphs_from_csv(io.StringIO(text), "default")
+    assert title == "Ecomap: mine"
+    assert imported.to_dict() == graph.to_dict()
+
+
+def test_generic_csv_does_not_invent_a_center():
+    text = "source,target,relation\na,b,negative\nb,c,\n"
+    ((title, graph),) = graphs_from_csv(io.StringIO(text), "default")
+    assert title == "default"
+    assert graph.nodes["a"] == {}
+    # relation and entity_type style the target; a source keeps what earlier rows gave it.
+    assert graph.nodes["b"]["color"] == "red"
+    assert graph.nodes["c"]["color"] == "green"
+    assert "blue" not in [attrs.get("color") for attrs in graph.nodes.values()]
+
+
+def test_csv_import_streams_maps_into_batches():
+    rows = ["map,source,target"] + [f"m{i // 2},p{i},q{i}" for i in range(10)]
+    data = io.BytesIO(("\n".join(rows) + "\n").encode("utf-8-sig"))
+
+    class History:
+        def __init__(self):
+            self.batches = []
+
+        def add_history_batch(self, entries):
+            self.batches.append([entry["title"] for entry in entries])
+
+    history = History()
+    saved = import_entries(history, csv_entries(text_lines(data), "Ecomap", "default"), batch_size=2)
+    assert saved == 5
+    assert history.batches == [["m0", "m1"], ["m2", "m3"], ["m4"]]
@@ -0,0 +1,66 @@
+from live import LiveInbox, LocalEventSource
+
+
+def row(sender, created_at, text="hi", receiver="me"):
+    return {"sender_id": sender, "receiver_id": receiver, "text": text, "created_at": created_at}
+
+
+def seeded_inbox():
+    inbox = LiveInbox("me")
+    inbox.seed([
+        {"contact_id": "a", "last_at": "2024-01-01", "unread_count": 0},
+        {"contact_id": "b", "last_at": "2024-01-02", "unread_count": 2},
+    ])
+    return inbox
+
+
+def test_seed_sets_contacts_and_unread():
+    inbox = seeded_inbox()
+    assert inbox.contacts == {"a", "b"}
+    assert inbox.unread == {"b": 2}
+    assert [c["contact_id"] for c in inbox.ordered()] == ["b", "a"]
+
+
+def test_push_updates_unread_and_order():
+    inbox = seeded_inbox()
+    inbox.push(row("a", "2024-01-03", "new"))
+    assert inbox.unread["a"] == 1
+    assert inbox.ordered()[0]["contact_id"] == "a"
+    assert inbox.ordered()[0]["last_text"] == "new"
+    assert [r["text"] for r in inbox.drain()] == ["new"]
+    assert inbox.drain() == []
+
+
+def test_push_from_non_contact_is_ignored():
+    inbox = seeded_inbox()
+    inbox.push(row("stranger", "2024-01-03"))
+    assert "stranger" not in inbox.conversations
+    assert inbox.drain() == []
+
+
+def test_mark_read_and_record_sent():
+    inbox = seeded_inbox()
+    assert inbox.mark_read("b") == 2
+    assert inbox.mark_read("b") == 0
+    inbox.record_sent(row("me", "2024-01-05", "mine", receiver="a"))
+    assert inbox.ordered()[0]["last_sender_id"] == "me"
+
+
+def test_stale_after_reseed_interval():
+    inbox = LiveInbox("me", reseed_seconds=60)
+    assert inbox.stale()
+    inbox.seed([])
+    assert not inbox.stale()
+    inbox.reseed_seconds = -1
+    assert inbox.stale()
+
+
+def test_local_source_delivers_to_the_receiver_only():
+    source = LocalEventSource()
+    mine, theirs = seeded_inbox().attach(source), LiveInbox("other")
+    theirs.seed([{"contact_id": "a"}])
+    theirs.attach(source)
+    source.notify_sent(row("a", "2024-01-03"))
+    assert len(mine.drain()) == 1
+    assert theirs.drain() == []
+    assert not source.subscribed("me")
@@ -0,0 +1,57 @@
+from data_access import InMemoryRepository
+from messages import ConversationWindow
+
+
+def message(i, sender="c", receiver="me"):
+    return {"id": i, "sender_id": sender, "receiver_id": receiver, "text": str(i), "created_at": f"2024-01-01T00:00:{i:02d}"}
+
+
+def make_repo(count):
+    repo = InMemoryRepository()
+    repo.tables["messages"] = [message(i) for i in range(count)]
+    return repo
+
+
+def ids(window):
+    return [m["id"] for m in window.messages]
+
+
+def test_first_sync_loads_newest_page():
+    window = ConversationWindow("me", "c", page_size=5)
+    assert window.sync(make_repo(12)) == 5
+    assert ids(window) == [7, 8, 9, 10, 11]
+    assert window.has_earlier
+
+
+def test_sync_only_fetches_past_the_high_water_mark():
+    repo = make_repo(3)
+    window = ConversationWindow("me", "c", page_size=5)
+    window.sync(repo)
+    repo.tables["messages"] += [message(3), message(4, sender="me", receiver="c")]
+    assert window.sync(repo) == 2
+    assert ids(window) == [0, 1, 2, 3, 4]
+    assert window.sync(repo) == 0
+
+
+def test_load_earlier_pages_back():
+    window = ConversationWindow("me", "c", page_size=5)
+    repo = make_repo(12)
+    window.sync(repo)
+    assert window.load_earlier(repo) == 4
+    assert ids(window) == list(range(3, 12))
+
+
+def test_merge_deduplicates_and_orders():
+    window = ConversationWindow("me", "c")
+    assert window.merge([message(2), message(1)]) == 2
+    assert window.merge([message(1), message(3)]) == 1
+    assert ids(window) == [1, 2, 3]
+
+
+def test_merge_trims_to_the_window_size():
+    window = ConversationWindow("me", "c", max_messages=3)
+    window.merge([message(i) for i in range(5)])
+    assert ids(window) == [2, 3, 4]
+    assert window.has_earlier
+    # A trimmed row can come back (e.g. from load_earlier).
+    assert window.merge([message(0)]) == 1
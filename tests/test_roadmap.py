@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from roadmap import aggregate, birth_year, downsample, parse_time, roadmap_frame, trend_frame
+
+
+@pytest.mark.parametrize("text, born, expected", [
+    ("2023", None, 2023.0),
+    ("Age 25", 1990, 2015.0),
+    ("age 25", None, 25.0),
+    ("25", 2000, 2025.0),
+    ("May 2019", None, 2019 + 4 / 12),
+    ("Sept. 2020", None, 2020 + 8 / 12),
+    ("2019-07", None, 2019 + 6 / 12),
+    ("03/2018", None, 2018 + 2 / 12),
+    ("Married 2019", None, 2019.0),
+    ("Japan 2010", None, 2010.0),
+    ("Graduated", None, None),
+])
+def test_parse_time(text, born, expected):
+    assert parse_time(text, born) == (pytest.approx(expected) if expected is not None else None)
+
+
+def test_birth_year():
+    assert birth_year({"dob": "1990-05-01"}) == 1990
+    assert birth_year({}) is None
+
+
+def frame():
+    return roadmap_frame([
+        ("2012", "C", 3, 2012.0),
+        ("Graduated", "Undated", 9, None),
+        ("2001", "A", 1, 2001.0),
+        ("2009", "B", -2, 2009.0),
+    ])
+
+
+def test_roadmap_frame_orders_by_key_with_undated_last():
+    df = frame()
+    assert list(df["Event"]) == ["A", "B", "C", "Undated"]
+    assert str(df["Impact"].dtype) == "int16"
+
+
+def test_trend_frame_drops_undated_events():
+    trend = trend_frame(frame(), window=2)
+    assert list(trend.index) == [2001.0, 2009.0, 2012.0]
+    assert list(trend["Cumulative"]) == [1.0, -1.0, 2.0]
+    assert list(trend["Rolling"]) == [1.0, -0.5, 0.5]
+
+
+def test_aggregate_buckets_by_period():
+    totals = aggregate(frame(), 10)
+    assert list(totals.index) == [2000, 2010]
+    assert list(totals["Total"]) == [-1.0, 3.0]
+    assert list(totals["Events"]) == [2, 1]
+
+
+def test_downsample_averages_into_buckets():
+    df = pd.DataFrame({"Impact": [float(i) for i in range(10)]}, index=pd.Index([float(i) for i in range(10)], name="Year"))
+    reduced = downsample(df, max_points=5)
+    assert list(reduced["Impact"]) == [0.5, 2.5, 4.5, 6.5, 8.5]
+    assert list(reduced.index) == [0.5, 2.5, 4.5, 6.5, 8.5]
+    assert reduced.index.name == "Year"
+    assert downsample(df, max_points=20) is df
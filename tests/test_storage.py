@@ -0,0 +1,164 @@
+import json
+
+import pytest
+
+from storage import (ChangeFeed, ConnectionPool, UserData, UserDataStore, UserStore, VersionConflict, init_schema,
+                     init_user_data_schema)
+
+EMAIL = "u@x.com"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "user_data.db"))
+    init_schema(pool)
+    init_user_data_schema(pool)
+    return pool
+
+
+def entry(title, kind="Ecomap", timestamp="2024-01-01 00:00:00"):
+    return {"type": kind, "title": title, "graph": {"nodes": {}, "edges": []}, "timestamp": timestamp}
+
+
+def test_user_store_rejects_duplicate_email(pool):
+    users = UserStore(pool)
+    assert users.create(EMAIL, "hash")
+    assert not users.create(EMAIL, "other")
+    assert users.get_password_hash(EMAIL) == "hash"
+    assert users.get_password_hash("nobody@x.com") is None
+
+
+def test_user_store_migrates_users_json_once(pool, tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps({EMAIL: "legacy", "b@x.com": "hash-b"}))
+    users = UserStore(pool)
+    users.create(EMAIL, "hash")
+    assert users.migrate_json(str(path)) == 1
+    # Existing rows win over the legacy file.
+    assert users.get_password_hash(EMAIL) == "hash"
+    assert users.get_password_hash("b@x.com") == "hash-b"
+    path.write_text(json.dumps({"c@x.com": "hash-c"}))
+    assert users.migrate_json(str(path)) == 0
+    assert users.get_password_hash("c@x.com") is None
+
+
+def test_user_store_migration_without_users_json(pool, tmp_path):
+    assert UserStore(pool).migrate_json(str(tmp_path / "missing.json")) == 0
+
+
+def test_user_data_migrates_json_document_once(pool, tmp_path):
+    path = tmp_path / "user.json"
+    path.write_text(json.dumps({
+        "bio": {"name": "Me"},
+        "history": [entry("Map")],
+        "lifemap": [["2020", "Later", 1], ["2010", "Earlier", 2]],
+    }))
+    store = UserDataStore(pool)
+    assert store.migrate_json(EMAIL, str(path))
+    assert not store.migrate_json(EMAIL, str(path))
+    data = UserData(store, EMAIL)
+    assert data.bio == {"name": "Me"}
+    assert data.history_page(0, 10)[1] == 1
+    assert list(data.roadmap["Event"]) == ["Earlier", "Later"]
+
+
+def test_bio_save_detects_concurrent_edit(pool):
+    store = UserDataStore(pool)
+    first, second = UserData(store, EMAIL), UserData(store, EMAIL)
+    read_at = second.bio_version
+    first.save_bio({"name": "First"}, expected_bio_version=first.bio_version)
+    with pytest.raises(VersionConflict):
+        second.save_bio({"name": "Second"}, expected_bio_version=read_at)
+    # The conflict reloads the latest bio, so a retry from it succeeds.
+    assert second.bio == {"name": "First"}
+    second.save_bio({"name": "Second"}, expected_bio_version=second.bio_version)
+    assert store.get_bio(EMAIL) == {"name": "Second"}
+
+
+def test_unrelated_writes_do_not_conflict_with_bio(pool):
+    store = UserDataStore(pool)
+    form, other = UserData(store, EMAIL), UserData(store, EMAIL)
+    read_at = form.bio_version
+    other.add_history(entry("Map"))
+    other.add_lifemap_event("2020", "Moved", 3)
+    form.save_bio({"name": "Still fine"}, expected_bio_version=read_at)
+    assert store.get_bio(EMAIL)["name"] == "Still fine"
+
+
+def test_refresh_picks_up_other_sessions_writes(pool):
+    store = UserDataStore(pool)
+    mine, other = UserData(store, EMAIL), UserData(store, EMAIL)
+    assert mine.bio == {}
+    assert not mine.refresh()
+    other.save_bio({"name": "New"})
+    assert mine.refresh()
+    assert mine.bio == {"name": "New"}
+
+
+def test_own_writes_keep_caches(pool):
+    data = UserData(UserDataStore(pool), EMAIL)
+    data.save_bio({"name": "Me"})
+    data.add_history(entry("Map"))
+    assert not data.refresh()
+
+
+def test_history_pages_and_filters(pool):
+    data = UserData(UserDataStore(pool), EMAIL)
+    data.add_history_batch([entry(f"Map {i}", timestamp=f"2024-01-0{i + 1} 00:00:00") for i in range(5)])
+    data.add_history(entry("Roadmap", kind="Life Roadmap", timestamp="2024-02-01 00:00:00"))
+    page, total = data.history_page(0, 2)
+    # Newest first.
+    assert total == 6 and [e["title"] for e in page] == ["Roadmap", "Map 4"]
+    page, total = data.history_page(0, 10, types=["Life Roadmap"])
+    assert total == 1 and page[0]["title"] == "Roadmap"
+    _, total = data.history_page(0, 10, since="2024-01-03", until="2024-01-05")
+    assert total == 2
+    data.delete_history(page[0]["id"])
+    assert data.history_page(0, 10)[1] == 5
+
+
+def test_history_payload_round_trip(pool):
+    data = UserData(UserDataStore(pool), EMAIL)
+    entry_id = data.add_history(entry("Map"))
+    assert data.history_payload(entry_id) == {"graph": {"nodes": {}, "edges": []}}
+
+
+def test_roadmap_orders_events_by_parsed_time(pool):
+    data = UserData(UserDataStore(pool), EMAIL)
+    for time, event in (("2020", "Later"), ("May 2010", "Earlier"), ("Married 2015", "Middle")):
+        data.add_lifemap_event(time, event, 1)
+    assert list(data.roadmap["Event"]) == ["Earlier", "Middle", "Later"]
+
+
+def test_age_events_are_rekeyed_when_dob_changes(pool):
+    store = UserDataStore(pool)
+    data = UserData(store, EMAIL)
+    data.add_lifemap_event("Age 25", "Graduated", 2)
+    data.add_lifemap_event("2000", "Moved", 1)
+    assert list(data.roadmap["Event"]) == ["Graduated", "Moved"]
+    data.save_bio({"dob": "1980-01-01"})
+    assert list(data.roadmap["Event"]) == ["Moved", "Graduated"]
+    assert list(data.roadmap["Key"]) == [2000.0, 2005.0]
+    # A fresh session reads the backfilled keys.
+    assert list(UserData(store, EMAIL).roadmap["Key"]) == [2000.0, 2005.0]
+
+
+def test_change_feed_reports_changes_from_any_connection(pool):
+    feed = ChangeFeed(pool)
+    users, names = [], []
+    feed.subscribe("users", users.extend)
+    feed.subscribe("names", names.extend)
+    UserStore(pool).create(EMAIL, "hash")
+    UserDataStore(pool).set_bio_fields(EMAIL, {"name": "Me"})
+    UserDataStore(pool).set_bio_fields(EMAIL, {"about": "no name change"})
+    assert feed.poll() == 2
+    assert users == [EMAIL] and names == [EMAIL]
+    assert feed.poll() == 0
+
+
+def test_names_lookup(pool):
+    store = UserDataStore(pool)
+    store.set_bio_fields("a@x.com", {"name": "A"})
+    store.set_bio_fields("b@x.com", {"about": "no name"})
+    assert store.names() == {"a@x.com": "A"}
+    assert store.names(["a@x.com", "b@x.com"]) == {"a@x.com": "A"}